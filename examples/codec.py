@@ -0,0 +1,45 @@
+"""
+This script compares the size and encode/decode time of the gradients sent
+by the clients for gradient tasks using pickle+base64 (`b64_encode`) and the
+binary codec (`b64_encode_arrays`).
+"""
+import time
+import torch
+import pandas as pd
+from tiresias.core import b64_encode, b64_decode, b64_encode_arrays, b64_decode_arrays
+from tiresias.core.gradients import get_gradients
+
+def timeit(func, *args, repeat=20, **kwargs):
+    start = time.time()
+    for _ in range(repeat):
+        result = func(*args, **kwargs)
+    return result, (time.time() - start) / repeat
+
+if __name__ == "__main__":
+    results = []
+    for nb_hidden in [10, 100, 1000]:
+        model = torch.nn.Sequential(
+            torch.nn.Linear(100, nb_hidden),
+            torch.nn.ReLU(),
+            torch.nn.Linear(nb_hidden, 1),
+        )
+        x, y = torch.randn(32, 100), torch.randn(32, 1)
+        torch.nn.functional.mse_loss(model(x), y).backward()
+        gradients = get_gradients(model, epsilon=10.0, delta=1e-5)
+
+        for name, encode, decode, kwargs in [
+            ("pickle", b64_encode, b64_decode, {}),
+            ("codec", b64_encode_arrays, b64_decode_arrays, {}),
+            ("codec+zlib", b64_encode_arrays, b64_decode_arrays, {"compress": True}),
+        ]:
+            encoded, encode_time = timeit(encode, gradients, **kwargs)
+            _, decode_time = timeit(decode, encoded)
+            results.append({
+                "nb_parameters": sum(p.numel() for p in model.parameters()),
+                "method": name,
+                "size": len(encoded),
+                "encode_time": encode_time,
+                "decode_time": decode_time,
+            })
+
+    print(pd.DataFrame(results).to_string(index=False))
@@ -0,0 +1,29 @@
+"""
+This script compares the row-by-row norm clipping which the integrated models
+used to perform with `tiresias.core.preprocessing.clip_norms` on a matrix with
+1M rows.
+"""
+import time
+import numpy as np
+from tiresias.core.preprocessing import clip_norms
+
+def clip_norms_loop(X, max_norm):
+    X = X.copy()
+    for i in range(X.shape[0]):
+        if np.linalg.norm(X[i]) > max_norm:
+            X[i] = X[i] * (max_norm - 1e-5) / np.linalg.norm(X[i])
+    return X
+
+if __name__ == "__main__":
+    X = np.random.normal(size=(1000000, 10))
+    norms = np.linalg.norm(X, axis=1)
+    max_norm = np.percentile(norms, 90)
+
+    start = time.time()
+    expected = clip_norms_loop(X, max_norm)
+    print("loop: %.2fs" % (time.time() - start))
+
+    start = time.time()
+    actual = clip_norms(X, max_norm, norms)
+    print("clip_norms: %.3fs" % (time.time() - start))
+    assert np.allclose(expected, actual)
@@ -7,7 +7,10 @@
 
     python examples/scalability.py --launch_clients
 
-so each instance will have 20 clients for a total of 20*N clients.
+so each instance will have 20 clients for a total of 20*N clients. Alternatively,
+simulate the clients in a single process on one instance with
+
+    python examples/scalability.py --simulate_clients 1000
 
 3. On your own computer, run
 
@@ -42,6 +45,15 @@ def launch_clients(nb_clients):
             "--synthetic",
         ])
 
+def simulate_clients(nb_clients):
+    from tiresias.client.simulation import Simulation
+    simulation = Simulation(server, nb_clients, in_memory=True)
+    try:
+        simulation.setup()
+        simulation.run()
+    finally:
+        simulation.close()
+
 def run_scalability(num_trials=20):
     results = []
 
@@ -106,6 +118,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--launch_server', action='store_true')
     parser.add_argument('--launch_clients', action='store_true')
+    parser.add_argument('--simulate_clients', type=int, default=0)
     parser.add_argument('--run_scalability', action='store_true')
     args = parser.parse_args()
 
@@ -115,6 +128,8 @@ if __name__ == "__main__":
     if args.launch_clients:
         launch_clients(nb_clients=20)
         sleep(10.0)
+    if args.simulate_clients:
+        simulate_clients(nb_clients=args.simulate_clients)
     if args.run_scalability:
         results = run_scalability()
         results.to_csv("scalability.csv", index=False)
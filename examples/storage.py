@@ -0,0 +1,57 @@
+"""
+This script measures the latency of `execute_sql` with 10 and 100 registered
+apps, comparing the shared `ConnectionManager` against opening a new
+connection and attaching every app database for each query. The result cache
+is disabled so that both measure the query itself.
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import pandas as pd
+from tiresias.client import storage
+
+def execute_sql_uncached(storage_dir, sql):
+    connection = sqlite3.connect(os.path.join(storage_dir, "metadata.db"))
+    connection.row_factory = storage.dict_factory
+    try:
+        for app in connection.execute("SELECT * FROM apps").fetchall():
+            path = os.path.join(storage_dir, app["app_name"] + ".db")
+            connection.execute('ATTACH DATABASE ? AS "%s"' % app["app_name"], (path,))
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+def execute_sql_pooled(storage_dir, sql):
+    return storage.execute_sql(storage_dir, sql, cache=False)
+
+def timeit(func, *args, repeat=200):
+    start = time.time()
+    for _ in range(repeat):
+        func(*args)
+    return (time.time() - start) / repeat
+
+if __name__ == "__main__":
+    results = []
+    for nb_apps in [10, 100]:
+        storage_dir = tempfile.mkdtemp()
+        storage.initialize(storage_dir)
+        for i in range(nb_apps):
+            storage.register_app(storage_dir, "app%s" % i, {
+                "events": {
+                    "description": "This table contains events.",
+                    "columns": {"value": {"type": "float", "description": "The value."}}
+                }
+            })
+            storage.insert_payload(storage_dir, "app%s" % i, {"events": [{"value": float(j)} for j in range(100)]})
+
+        sql = "SELECT AVG(value) AS value FROM app%s.events" % (nb_apps - 1)
+        for name, execute in [("uncached", execute_sql_uncached), ("pooled", execute_sql_pooled)]:
+            try:
+                latency = timeit(execute, storage_dir, sql)
+            except sqlite3.OperationalError as err:
+                print("%s with %s apps: %s" % (name, nb_apps, err))
+                latency = float("nan")
+            results.append({"nb_apps": nb_apps, "method": name, "latency_ms": latency * 1000.0})
+
+    print(pd.DataFrame(results))
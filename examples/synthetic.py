@@ -0,0 +1,37 @@
+"""
+This script measures the throughput (in rows per second) of the synthetic data
+generator, both for sampling alone and for populating the storage directories
+of simulated devices. The target is at least 500k rows/s for sampling and 50k
+rows/s end-to-end on a single core.
+"""
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+from tiresias.client import storage
+from tiresias.client.synthetic import sample_profiles, sample_histories, sample_screen_times, create_synthetic_datasets
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    sample_profiles(1, rng)
+
+    for nb_devices in [100, 1000, 10000]:
+        start = time.time()
+        profiles = sample_profiles(nb_devices, rng)
+        histories = sample_histories(profiles, rng)
+        screen_times = sample_screen_times(profiles, rng)
+        elapsed = time.time() - start
+        nb_rows = nb_devices + sum(len(h["history"]) for h in histories) + sum(len(s["events"]) + len(s["types"]) for s in screen_times)
+        print("sampling %s devices: %s rows, %.0f rows/s" % (nb_devices, nb_rows, nb_rows / elapsed))
+
+    for nb_devices in [100, 1000]:
+        base = tempfile.mkdtemp(dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        storage_dirs = [os.path.join(base, str(i)) for i in range(nb_devices)]
+        for storage_dir in storage_dirs:
+            storage.initialize(storage_dir, journal_mode="MEMORY", synchronous="OFF")
+        start = time.time()
+        nb_rows = create_synthetic_datasets(storage_dirs, seed=0)
+        elapsed = time.time() - start
+        print("populating %s devices: %s rows, %.0f rows/s" % (nb_devices, nb_rows, nb_rows / elapsed))
+        shutil.rmtree(base)
@@ -34,6 +34,9 @@ setup(
     include_package_data=True,
     author='Kevin Alex Zhang',
     install_requires=install_requires,
+    extras_require={
+        "asyncio": ["aiohttp>=3.5"],
+    },
     dependency_links=dependency_links,
     author_email='kevz@mit.edu',
     scripts=["scripts/tiresias", "scripts/tiresias-server"]
@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import pytest
+import subprocess
+from tiresias.core import codec
+from tiresias.benchmark.load import TASK_TYPES, make_task, make_payloads, summarize, memory_usage
+
+def test_make_payloads():
+    for task_type in TASK_TYPES:
+        task = make_task(task_type, 10)
+        payloads = make_payloads(task, 3, nb_rows=5, seed=0)
+        assert len(payloads) == 3
+        for payload in payloads:
+            if task_type == "gradient":
+                assert len(codec.decode(payload)) == 2
+            else:
+                assert json.loads(payload)
+
+def test_summarize():
+    submits = [{"type": "basic", "start": 0.0, "latency": i / 100.0, "accepted": True} for i in range(101)]
+    tasks = [{"id": "a", "type": "basic", "status": "COMPLETE", "latency": 2.0, "server_latency": 1.0}]
+    memory = [{"time": 0.0, "rss": 100}, {"time": 0.5, "rss": None}]
+    report = summarize(submits, tasks, memory, duration=10.0)
+
+    basic, total = report["summary"]
+    assert basic["type"] == "basic" and total["type"] == "all"
+    assert basic["throughput"] == 10.1
+    assert basic["latency_p50"] == 0.5
+    assert basic["latency_p99"] == 0.99
+    assert basic["completed"] == 1 and basic["completion_p50"] == 2.0
+    assert report["max_rss"] == 100
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="requires /proc")
+def test_memory_usage():
+    # The child allocates ~50 MB so it dominates the noise in the RSS of this process.
+    child = subprocess.Popen([sys.executable, "-c", "import sys, time; x = bytearray(50 * 2**20); sys.stdout.write('ready'); sys.stdout.flush(); time.sleep(30)"], stdout=subprocess.PIPE)
+    try:
+        child.stdout.read(5)
+        alone = memory_usage(os.getpid(), children=False)
+        total = memory_usage(os.getpid())
+        assert total - alone >= 50 * 2**20
+    finally:
+        child.kill()
+        child.wait()
+    assert memory_usage(child.pid) is None
@@ -0,0 +1,64 @@
+import asyncio
+from json import dumps
+import pytest
+from tiresias.client import storage
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer
+from tiresias.client.aio import Device, create_storage_app
+
+def test_storage_app(tmpdir):
+    storage.initialize(tmpdir)
+    device = Device("http://localhost:1/", tmpdir)
+
+    async def _test():
+        client = TestClient(TestServer(create_storage_app(device, None)))
+        await client.start_server()
+        try:
+            schema = {"tableA": {"description": "", "columns": {"x": {"type": "float", "description": ""}}}}
+            response = await client.get("/app/example_app/register", params={"schema": dumps(schema)})
+            assert response.status == 200
+            response = await client.get("/app/example_app/insert", params={"payload": dumps({"tableA": [{"x": 1.0}, {"x": 2.0}]})})
+            assert response.status == 200
+            response = await client.get("/app")
+            assert [row["column_name"] for row in await response.json()] == ["x"]
+
+            await client.get("/whitelist/task")
+            assert device.whitelist == {"task"}
+        finally:
+            await client.close()
+
+    asyncio.run(_test())
+    assert storage.execute_sql(tmpdir, "SELECT SUM(x) AS x FROM example_app.tableA") == [{"x": 3.0}]
+
+def test_device_execute(tmpdir):
+    storage.initialize(tmpdir)
+    storage.register_app(tmpdir, "example_app", {"tableA": {"description": "", "columns": {"x": {"type": "float", "description": ""}}}})
+    storage.insert_payload(tmpdir, "example_app", {"tableA": [{"x": 1.0}]})
+    submitted = {}
+
+    class Session(object):
+        def post(self, url, **kwargs):
+            submitted[url] = kwargs
+            return Response()
+
+    class Response(object):
+        async def __aenter__(self):
+            return self
+        async def __aexit__(self, *args):
+            pass
+        async def text(self):
+            return "true"
+
+    task = {"id": "task", "type": "basic", "featurizer": "SELECT x FROM example_app.tableA"}
+    device = Device("http://localhost:1/", tmpdir)
+    assert device._semaphore is None
+    assert asyncio.run(device.execute(Session(), task))
+    assert submitted == {"http://localhost:1/task/task/submit": {"json": [1.0]}}
+    assert device._semaphore is not None
+
+    # The binary results (i.e. gradients) are sent as is.
+    device._handle_task = lambda task: (b"gradients", None)
+    assert asyncio.run(device.execute(Session(), dict(task, id="binary")))
+    assert submitted["http://localhost:1/task/binary/submit"] == {
+        "data": b"gradients", "headers": {"Content-Type": "application/octet-stream"}}
@@ -1,5 +1,5 @@
 from tiresias.client import handler, storage
-from tiresias.core import b64_encode, b64_decode
+from tiresias.core import b64_encode, b64_decode, codec
 
 def test_handle_basic():
     task = {
@@ -28,6 +28,30 @@ def test_handle_bounded():
         assert result[i]["x"] in set([0, 1, 2, 3])
         assert type(result[i]["y"]) == float
 
+def test_handle_bounded_columns():
+    task = {
+        "type": "bounded",
+        "epsilon": float("inf"),
+        "featurizer": "SELECT * FROM dummy",
+        "bounds": {
+            "x": {"type": "set", "values": [0, 1, 2, 3], "default": 0},
+            "y": {"type": "range", "low": 0.0, "high": 1.0},
+            "label": {"type": "set", "values": ["a", "b"], "default": "a"},
+        }
+    }
+    data = [{"x": 2, "y": 0.5, "label": "b"}, {"x": 7, "y": 3.0, "label": "c"}]
+    assert handler.handle_bounded(task, data) == [
+        {"x": 2, "y": 0.5, "label": "b"},
+        {"x": 0, "y": 1.0, "label": "a"},
+    ]
+    assert handler.handle_bounded(task, []) == []
+
+    task["epsilon"] = 1.0
+    result = handler.handle_bounded(task, data * 500)
+    assert len(result) == 1000
+    assert set(type(row["x"]) for row in result) == {int}
+    assert set(row["label"] for row in result) <= {"a", "b"}
+
 def test_handle_gradient():
     import torch
     task = {
@@ -48,7 +72,7 @@ def test_handle_gradient():
         {"x0": 1.0, "x1": 1.0, "y": 2.0}
     ]
     result = handler.handle_gradient(task, data)
-    assert b64_decode(result)
+    assert [tuple(g.shape) for g in codec.decode(result)] == [(1, 2), (1,)]
 
 def test_handle_task(tmpdir):
     storage.initialize(tmpdir)
@@ -81,3 +105,48 @@ def test_handle_task(tmpdir):
     }
     result, err = handler.handle_task(tmpdir, task)
     assert result[0] == 15.0
+
+def test_handle_task_columnar(tmpdir):
+    import torch
+    storage.initialize(tmpdir)
+    storage.register_app(tmpdir, "example_app", {
+        "tableA": {
+            "description": "This table contains A.",
+            "columns": {
+                "x": {"type": "float", "description": "This column contains x."},
+                "y": {"type": "int", "description": "This column contains y."},
+                "label": {"type": "string", "description": "This column contains a label."}
+            }
+        }
+    })
+    storage.insert_payload(tmpdir, "example_app", {
+        "tableA": [{"x": float(i), "y": i % 2, "label": "abc"[i % 3]} for i in range(10)]
+    })
+
+    data = storage.execute_sql(tmpdir, "SELECT x, y, label FROM example_app.tableA", columnar=True)
+    assert data["x"].dtype.kind == "f" and data["y"].dtype.kind == "i" and data["label"].dtype.kind == "U"
+    assert list(data["y"]) == [i % 2 for i in range(10)]
+
+    task = {
+        "type": "integrated",
+        "epsilon": 1.0,
+        "featurizer": "SELECT x, y FROM example_app.tableA",
+        "model": "LogisticRegression",
+        "inputs": ["x"],
+        "output": "y"
+    }
+    result, err = handler.handle_task(tmpdir, task)
+    assert not err and result == {"x": [float(i) for i in range(10)], "y": [i % 2 for i in range(10)]}
+
+    task = {
+        "type": "gradient",
+        "epsilon": 10.0,
+        "delta": 1e-5,
+        "featurizer": "SELECT x, y FROM example_app.tableA",
+        "model": b64_encode(torch.nn.Sequential(torch.nn.Linear(1, 1))),
+        "loss": b64_encode(torch.nn.functional.mse_loss),
+        "inputs": ["x"],
+        "output": ["y"],
+    }
+    result, err = handler.handle_task(tmpdir, task)
+    assert not err and len(codec.decode(result)) == 2
@@ -0,0 +1,86 @@
+import requests
+import threading
+from time import sleep
+import tiresias.server.remote
+import tiresias.client.runner as runner
+
+def test_task_runner(monkeypatch):
+    submitted, event = {}, threading.Event()
+    monkeypatch.setattr(tiresias.server.remote, "approve_tasks", lambda server_url, payloads: submitted.update(payloads))
+
+    def _handle_task(storage_dir, task, readers):
+        with readers:
+            if task["id"] == "slow":
+                event.wait(5.0)
+            return task["id"], None
+    monkeypatch.setattr(runner, "handle_task", _handle_task)
+
+    task_runner = runner.TaskRunner("", "", max_workers=2)
+    slow = task_runner.submit({"id": "slow"})
+    task_runner.submit({"id": "fast"}).result()
+    sleep(0.1)
+    assert submitted == {"fast": "fast"}
+    assert task_runner.running() == ["slow"]
+
+    # Both workers are busy so this task stays queued until it is cancelled.
+    task_runner.submit({"id": "other_slow"})
+    task_runner.submit({"id": "queued"})
+    task_runner.cancel("queued")
+    task_runner.cancel("other_slow")
+    event.set()
+    slow.result()
+    task_runner.shutdown()
+    assert submitted == {"fast": "fast", "slow": "slow"}
+
+def test_task_runner_timeout(monkeypatch):
+    submitted = {}
+    monkeypatch.setattr(tiresias.server.remote, "approve_tasks", lambda server_url, payloads: submitted.update(payloads))
+    monkeypatch.setattr(runner, "handle_task", lambda storage_dir, task, readers: (sleep(0.2), None))
+
+    task_runner = runner.TaskRunner("", "", timeout=0.1)
+    task_runner.submit({"id": "slow"}).result()
+    task_runner.shutdown()
+    assert submitted == {} and task_runner.running() == []
+
+def test_task_runner_batches(monkeypatch):
+    batches, started, event = [], threading.Event(), threading.Event()
+    def _approve_tasks(server_url, payloads):
+        batches.append(dict(payloads))
+        if len(batches) == 1:
+            started.set()
+            event.wait(5.0)
+        elif len(batches) == 2:
+            raise requests.exceptions.ConnectionError()
+    monkeypatch.setattr(tiresias.server.remote, "approve_tasks", _approve_tasks)
+    gate = threading.Event()
+    monkeypatch.setattr(runner, "handle_task", lambda storage_dir, task, readers: (gate.wait(5.0), task["id"], None)[1:])
+
+    # The results which complete while the first request is in flight share the next one.
+    task_runner = runner.TaskRunner("", "", max_workers=2)
+    task_runner.submit({"id": "a"})
+    gate.set()
+    started.wait(5.0)
+    task_runner.submit({"id": "b"})
+    task_runner.submit({"id": "c"})
+    while len(task_runner._outbox) < 2:
+        sleep(0.01)
+    event.set()
+    task_runner.shutdown()
+    assert batches == [{"a": "a"}, {"b": "b", "c": "c"}]
+
+    # The server was offline so the results are kept for the next flush.
+    task_runner.flush()
+    assert batches[-1] == {"b": "b", "c": "c"} and len(batches) == 3
+
+def test_task_runner_binary(monkeypatch):
+    # The binary results are sent on their own rather than in the JSON batch.
+    batches, binary = [], {}
+    monkeypatch.setattr(tiresias.server.remote, "approve_tasks", lambda server_url, payloads: batches.append(payloads))
+    monkeypatch.setattr(tiresias.server.remote, "approve_task", lambda server_url, task_id, payload: binary.update({task_id: payload}))
+    monkeypatch.setattr(runner, "handle_task", lambda storage_dir, task, readers: (task["result"], None))
+
+    task_runner = runner.TaskRunner("", "", max_workers=1)
+    task_runner.submit({"id": "a", "result": b"gradients"}).result()
+    task_runner.submit({"id": "b", "result": [1.0]}).result()
+    task_runner.shutdown()
+    assert binary == {"a": b"gradients"} and batches == [{"b": [1.0]}]
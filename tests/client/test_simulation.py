@@ -0,0 +1,21 @@
+import os
+import pytest
+
+pytest.importorskip("aiohttp")
+from tiresias.client import storage
+from tiresias.client.simulation import Simulation
+
+def test_simulation_setup():
+    simulation = Simulation("http://localhost:1", 3, in_memory=True)
+    assert simulation.server_url == "http://localhost:1/"
+    try:
+        simulation.setup()
+        for device in simulation.devices:
+            data = storage.execute_sql(device.storage_dir, "SELECT age FROM profile.demographics")
+            assert len(data) == 1
+        assert len(set(device.storage_dir for device in simulation.devices)) == 3
+        assert all(os.path.abspath(device.storage_dir) in storage._managers for device in simulation.devices)
+    finally:
+        simulation.close()
+    assert not os.path.exists(simulation.storage_dir)
+    assert not any(os.path.abspath(device.storage_dir) in storage._managers for device in simulation.devices)
@@ -1,3 +1,4 @@
+import os
 from tiresias.client import storage
 
 def test_initialize(tmpdir):
@@ -125,3 +126,203 @@ def test_insert_payload_2(tmpdir):
 
     data = storage.execute_sql(tmpdir, "SELECT * FROM app2.tableB")
     assert len(data) == 2, "Expected two rows of data"
+
+def test_execute_sql_many_apps(tmpdir):
+    storage.initialize(tmpdir)
+    nb_apps = storage.MAX_ATTACHED + 5
+    for i in range(nb_apps):
+        storage.register_app(tmpdir, "app%s" % i, {
+            "tableA": {
+                "description": "This table contains A.",
+                "columns": {
+                    "some_var": {
+                        "type": "float",
+                        "description": "This column contains 1."
+                    }
+                }
+            }
+        })
+        storage.insert_payload(tmpdir, "app%s" % i, {"tableA": [{"some_var": float(i)}]})
+
+        # Apps registered after the connection was opened are attached as well.
+        data = storage.execute_sql(tmpdir, "SELECT * FROM app%s.tableA" % i)
+        assert data == [{"some_var": float(i)}]
+
+    for i in reversed(range(nb_apps)):
+        data = storage.execute_sql(tmpdir, "SELECT a.some_var + b.some_var AS x FROM app%s.tableA a, app0.tableA b" % i)
+        assert data == [{"x": float(i)}]
+
+def test_insert_rows(tmpdir):
+    storage.initialize(tmpdir, synchronous="OFF", page_size=8192)
+    storage.register_app(tmpdir, "example_app", {
+        "tableA": {
+            "description": "This table contains A.",
+            "columns": {
+                "some_var": {
+                    "type": "float",
+                    "description": "This column contains 1."
+                },
+                "other_var": {
+                    "type": "float",
+                    "description": "This column contains 2."
+                }
+            }
+        }
+    })
+
+    # Rows with different columns are written in separate batches.
+    rows = ({"some_var": float(i)} if i % 3 else {"other_var": 1.0, "some_var": float(i)} for i in range(2500))
+    assert storage.insert_rows(tmpdir, "example_app", "tableA", rows, batch_size=100) == 2500
+
+    data = storage.execute_sql(tmpdir, "SELECT COUNT(*) AS n, SUM(some_var) AS x, SUM(other_var) AS y FROM example_app.tableA")
+    assert data == [{"n": 2500, "x": float(sum(range(2500))), "y": 834.0}]
+
+    data = storage.execute_sql(tmpdir, "PRAGMA example_app.page_size")
+    assert data == [{"page_size": 8192}]
+    data = storage.execute_sql(tmpdir, "PRAGMA example_app.journal_mode")
+    assert data == [{"journal_mode": "wal"}]
+
+def test_register_app_indexes(tmpdir):
+    storage.initialize(tmpdir)
+    storage.register_app(tmpdir, "browsing", {
+        "history": {
+            "description": "This table contains the browsing history.",
+            "columns": {
+                "timestamp": {"type": "float", "description": "When the website was opened.", "index": True},
+                "domain": {"type": "string", "description": "The domain."},
+                "visits": {"type": "int", "description": "The number of visits."}
+            },
+            "indexes": [["domain", "timestamp"]]
+        }
+    })
+    storage.insert_payload(tmpdir, "browsing", {"history": [
+        {"timestamp": 1, "domain": "mit.edu", "visits": "2"},
+    ]})
+    data = storage.execute_sql(tmpdir, "SELECT typeof(timestamp) AS t, typeof(domain) AS d, typeof(visits) AS v FROM browsing.history")
+    assert data == [{"t": "real", "d": "text", "v": "integer"}]
+
+    indexes = storage.execute_sql(tmpdir, "SELECT sql FROM browsing.sqlite_master WHERE type = 'index'")
+    assert len(indexes) == 2
+    assert any("(timestamp)" in row["sql"] for row in indexes)
+    assert any("(domain, timestamp)" in row["sql"] for row in indexes)
+
+    storage.add_index(tmpdir, "browsing", "history", "visits")
+    data = storage.execute_sql(tmpdir, "SELECT * FROM browsing.history WHERE visits > 1")
+    assert len(data) == 1
+    plan = storage.execute_sql(tmpdir, "EXPLAIN QUERY PLAN SELECT * FROM browsing.history WHERE visits > 1")
+    assert "INDEX history_" in plan[0]["detail"]
+
+def test_register_app_index_names(tmpdir):
+    storage.initialize(tmpdir)
+    storage.register_app(tmpdir, "example_app", {
+        "a": {
+            "description": "This table contains A.",
+            "columns": {
+                "b_c": {"type": "int", "description": "The value.", "index": True},
+                "b": {"type": "int", "description": "The value."},
+                "c": {"type": "int", "description": "The value."},
+            },
+            "indexes": [["b", "c"]]
+        },
+        "a_b": {
+            "description": "This table contains A_B.",
+            "columns": {
+                "c": {"type": "int", "description": "The value.", "index": True},
+            }
+        }
+    })
+    indexes = storage.execute_sql(tmpdir, "SELECT name FROM example_app.sqlite_master WHERE type = 'index'")
+    assert len(set(row["name"] for row in indexes)) == 3
+
+def test_execute_sql_cache(tmpdir):
+    storage.initialize(tmpdir)
+    storage.register_app(tmpdir, "example_app", {
+        "tableA": {
+            "description": "This table contains A.",
+            "columns": {
+                "some_var": {
+                    "type": "float",
+                    "description": "This column contains 1."
+                }
+            }
+        }
+    })
+    storage.insert_payload(tmpdir, "example_app", {"tableA": [{"some_var": 1.0}]})
+    manager = storage.connection_manager(tmpdir)
+
+    data = storage.execute_sql(tmpdir, "SELECT some_var FROM example_app.tableA")
+    assert data == [{"some_var": 1.0}] and len(manager._cache) == 1
+
+    # Equivalent queries are served from the cache and the rows can be safely modified.
+    data[0]["some_var"] = 2.0
+    data = storage.execute_sql(tmpdir, "SELECT   some_var\nFROM example_app.tableA;")
+    assert data == [{"some_var": 1.0}] and len(manager._cache) == 1
+
+    # Inserting data into the app invalidates the cached results.
+    storage.insert_rows(tmpdir, "example_app", "tableA", [{"some_var": 2.0}])
+    assert len(manager._cache) == 0
+    data = storage.execute_sql(tmpdir, "SELECT some_var FROM example_app.tableA")
+    assert data == [{"some_var": 1.0}, {"some_var": 2.0}]
+
+    # Non-deterministic queries are not cached.
+    storage.execute_sql(tmpdir, "SELECT some_var FROM example_app.tableA ORDER BY RANDOM()")
+    assert len(manager._cache) == 1
+
+    assert storage.normalize_sql("SELECT  'a  b' ,\n x;") == "SELECT 'a  b' , x"
+
+def test_execute_sql_cache_unqualified(tmpdir):
+    storage.initialize(tmpdir)
+    for app_name, table_name in [("app_a", "tableA"), ("app_b", "tableB")]:
+        storage.register_app(tmpdir, app_name, {
+            table_name: {
+                "description": "This table contains values.",
+                "columns": {"value": {"type": "float", "description": "The value."}}
+            }
+        })
+        storage.insert_rows(tmpdir, app_name, table_name, [{"value": 1.0}])
+    manager = storage.connection_manager(tmpdir)
+
+    # SQLite resolves the unqualified table to `app_b` so the result depends on both apps.
+    sql = "SELECT COUNT(*) AS n FROM app_a.tableA, tableB"
+    assert storage.execute_sql(tmpdir, sql) == [{"n": 1}]
+    storage.insert_rows(tmpdir, "app_b", "tableB", [{"value": 2.0}])
+    assert storage.execute_sql(tmpdir, sql) == [{"n": 2}]
+
+    # Invalidating the manager drops the cached results.
+    assert len(manager._cache) == 1
+    manager.invalidate()
+    assert len(manager._cache) == 0
+
+    assert storage.has_unqualified_tables("SELECT * FROM apps")
+    assert storage.has_unqualified_tables("SELECT * FROM a.t JOIN u ON a.t.x = u.x")
+    assert storage.has_unqualified_tables("SELECT * FROM a.t WHERE x IN (SELECT y FROM u)")
+    assert not storage.has_unqualified_tables("SELECT x, y FROM a.t AS t JOIN b.u USING (x) WHERE y > 1")
+    assert not storage.has_unqualified_tables("SELECT * FROM (SELECT x FROM a.t) s")
+
+def test_result_cache():
+    cache = storage.ResultCache(100)
+    cache.put("a", 1, 40)
+    cache.put("b", 2, 40)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 40)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    cache.put("d", 4, 101)
+    assert cache.get("d") is None and cache.nbytes == 80
+
+def test_release(tmpdir):
+    storage.initialize(tmpdir, journal_mode="MEMORY")
+    storage.register_app(tmpdir, "example_app", {"tableA": {"description": "", "columns": {"x": {"type": "float", "description": ""}}}})
+    storage.insert_rows(tmpdir, "example_app", "tableA", [{"x": 1.0}])
+    manager = storage.connection_manager(tmpdir)
+    assert storage.execute_sql(tmpdir, "SELECT x FROM example_app.tableA") == [{"x": 1.0}]
+    assert len(manager._cache) == 1
+
+    storage.release(tmpdir)
+    key = os.path.abspath(str(tmpdir))
+    assert key not in storage._managers and key not in storage._pragmas
+    assert len(manager._cache) == 0 and manager._local.connection is None
+
+    # The storage directory can still be used and the pragmas are read back from the settings.
+    assert storage.execute_sql(tmpdir, "SELECT x FROM example_app.tableA") == [{"x": 1.0}]
+    assert storage.connection_manager(tmpdir) is not manager
+    assert storage._pragmas[key]["journal_mode"] == "MEMORY"
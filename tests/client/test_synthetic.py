@@ -0,0 +1,36 @@
+import numpy as np
+from tiresias.client import storage, synthetic
+
+def test_sample_seeded():
+    profiles = synthetic.sample_profiles(10, np.random.default_rng(0))
+    assert profiles == synthetic.sample_profiles(10, np.random.default_rng(0))
+    for profile in profiles:
+        row = profile["demographics"][0]
+        assert 18 <= row["age"] <= 100 and type(row["age"]) == int
+        assert len(row["zipcode"]) == 5 and row["city"] and len(row["state"]) == 2
+        assert row["gender"] in ["Male", "Female", "Other"]
+
+    histories = synthetic.sample_histories(profiles, np.random.default_rng(0))
+    assert histories == synthetic.sample_histories(profiles, np.random.default_rng(0))
+    assert synthetic.sample_screen_times(profiles, np.random.default_rng(0)) == synthetic.sample_screen_times(profiles, np.random.default_rng(0))
+    for profile, history in zip(profiles, histories):
+        assert 100 - int(99 * profile["demographics"][0]["age"] / 100.0) <= len(history["history"]) <= 100
+
+    for screen_time in synthetic.sample_screen_times(profiles, np.random.default_rng(0)):
+        events = screen_time["events"]
+        assert 2 <= len(events) <= 200
+        assert [event["event_type"] for event in events[:2]] == ["open", "close"]
+        assert events[0]["application_name"] == events[1]["application_name"]
+        assert events[0]["timestamp"] <= events[1]["timestamp"]
+
+def test_create_synthetic_datasets(tmpdir):
+    storage_dirs = [str(tmpdir.mkdir("device%s" % i)) for i in range(3)]
+    for storage_dir in storage_dirs:
+        storage.initialize(storage_dir)
+    nb_rows = synthetic.create_synthetic_datasets(storage_dirs, seed=0)
+
+    total = 0
+    for storage_dir in storage_dirs:
+        for table in ["profile.demographics", "browsing.history", "screen_time.events", "screen_time.types"]:
+            total += storage.execute_sql(storage_dir, "SELECT COUNT(*) AS n FROM %s" % table)[0]["n"]
+    assert total == nb_rows
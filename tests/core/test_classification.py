@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+from tiresias.core.classification import TiresiasClassifier
+
+def test_tiresias_classifier():
+    X = np.random.normal(size=(1000, 2))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    candidates = [{"model": "LogisticRegression", "C": C} for C in [0.1, 1.0, 10.0]]
+
+    clf = TiresiasClassifier(epsilon=10.0, candidates=candidates, n_jobs=2).fit(X, y)
+    assert (clf.predict(X) == y).mean() > 0.8
+    assert [timing["C"] for timing in clf.timings_] == [0.1, 1.0, 10.0]
+    assert all(timing["time"] > 0.0 and 0.0 <= timing["score"] <= 1.0 for timing in clf.timings_)
+
+    clf = TiresiasClassifier(epsilon=10.0, candidates=candidates[:1], refit=False).fit(X, y)
+    assert (clf.predict(X) == y).mean() > 0.8
+
+def test_tiresias_classifier_candidates():
+    for candidates in [
+        [],
+        [{"model": "LogisticRegression", "C": C} for C in range(1, 100)],
+        [{"model": "SVC"}],
+        [{"model": "LogisticRegression", "solver": "newton-cg"}],
+        [{"model": "LogisticRegression", "C": -1.0}],
+        [{"model": "LogisticRegression", "C": "1.0"}],
+        [{"model": "GaussianNB", "var_smoothing": float("inf")}],
+    ]:
+        with pytest.raises(AssertionError):
+            TiresiasClassifier(epsilon=10.0, candidates=candidates)
+
+def test_tiresias_classifier_n_jobs(monkeypatch):
+    import tiresias.core.classification as classification
+    pools = []
+    class Executor(classification.ThreadPoolExecutor):
+        def __init__(self, max_workers):
+            pools.append(max_workers)
+            super().__init__(max_workers)
+    monkeypatch.setattr(classification, "ThreadPoolExecutor", Executor)
+    monkeypatch.setattr(classification.os, "cpu_count", lambda: 4)
+
+    X = np.random.normal(size=(200, 2))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    candidates = [{"model": "LogisticRegression", "C": C} for C in [0.1, 1.0, 10.0]]
+    for n_jobs in [-1, 2, 100]:
+        clf = TiresiasClassifier(epsilon=10.0, candidates=candidates, n_jobs=n_jobs).fit(X, y)
+        assert len(clf.timings_) == 3
+    assert pools == [3, 2, 3]
+
+    for n_jobs in [0, -2, 1.5, "2"]:
+        with pytest.raises(AssertionError):
+            TiresiasClassifier(epsilon=10.0, n_jobs=n_jobs)
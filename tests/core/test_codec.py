@@ -0,0 +1,40 @@
+import torch
+import pytest
+import numpy as np
+from tiresias.core import codec, b64_encode_arrays, b64_decode, b64_decode_arrays
+
+def test_codec():
+    arrays = [
+        np.arange(10, dtype=">f8").reshape(2, 5)[:, ::2],
+        torch.randn(3, 4),
+        np.array(3, dtype=np.int16),
+        np.zeros(0),
+    ]
+    for compress in [False, True]:
+        buffer = codec.encode(arrays, compress=compress)
+        assert codec.is_encoded(buffer)
+        decoded = codec.decode(buffer)
+        assert type(decoded[1]) == torch.Tensor
+        for x, y in zip(arrays, decoded):
+            assert np.asarray(x).shape == np.asarray(y).shape
+            assert np.array_equal(np.asarray(x), np.asarray(y))
+        decoded[1] += 1.0
+
+def test_codec_zero_copy():
+    buffer = bytearray(codec.encode([np.arange(10.0), torch.ones(3)]))
+    decoded = codec.decode(buffer)
+    assert np.shares_memory(decoded[0], np.frombuffer(buffer, dtype=np.uint8))
+    decoded[0][0] = 5.0
+    assert codec.decode(buffer)[0][0] == 5.0
+
+def test_codec_max_size():
+    buffer = codec.encode([np.zeros(1000)], compress=True)
+    assert codec.decode(buffer, max_size=8100)[0].shape == (1000,)
+    with pytest.raises(ValueError):
+        codec.decode(buffer, max_size=8000)
+
+def test_b64_encode_arrays():
+    gradients = [torch.randn(10, 2), torch.randn(10)]
+    encoded = b64_encode_arrays(gradients)
+    for decoded in [b64_decode(encoded), b64_decode_arrays(encoded)]:
+        assert all(torch.equal(x, y) for x, y in zip(gradients, decoded))
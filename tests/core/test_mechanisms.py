@@ -0,0 +1,80 @@
+import numpy as np
+from pytest import approx
+from tiresias.core import mechanisms
+
+def _reference_bounds(x, epsilon=1.0, scale=0.1, base=2, bins=128, p=0.9999):
+    threshold = -np.log(2 - 2 * p) / epsilon
+    cutoffs = scale * np.power(base, np.arange(0, bins//2-1))
+    cutoffs = (-cutoffs[::-1]).tolist() + [0] + cutoffs.tolist()
+    histogram = np.random.laplace(size=bins, scale=1.0 / epsilon)
+    x = sorted(x.tolist())
+    for i in range(bins-1):
+        while len(x) > 0 and x[0] < cutoffs[i]:
+            x.pop(0)
+            histogram[i] += 1
+    histogram[-1] += len(x)
+    has_value = (histogram > threshold).nonzero()[0]
+    first, last = has_value[0] - 1, has_value[-1]
+    return cutoffs[first], cutoffs[last]
+
+def test_approximate_bounds():
+    x = np.concatenate([np.random.normal(size=500) * 10.0, [0.0, 0.1, -0.1, 0.2]])
+    for seed in range(10):
+        np.random.seed(seed)
+        expected = _reference_bounds(x)
+        np.random.seed(seed)
+        assert mechanisms.approximate_bounds(x) == approx(expected)
+
+def test_approximate_column_bounds():
+    X = np.random.uniform(low=-5.0, high=100.0, size=(1000, 3))
+    X[:, 1] *= 0.01
+    bounds = mechanisms.approximate_column_bounds(X, epsilon=1.0)
+    assert len(bounds) == 3
+    for column, (low, high) in enumerate(bounds):
+        assert low < high
+        assert low <= np.percentile(X[:, column], 5)
+        assert high >= np.percentile(X[:, column], 95)
+
+def test_finite_categorical():
+    x = np.random.randint(0, 4, size=10000)
+    original = x.copy()
+    y = mechanisms.finite_categorical(x, [0, 1, 2, 3], epsilon=np.log(3.0))
+    assert (x == original).all()
+    assert set(y.tolist()) <= {0, 1, 2, 3}
+    # p = (3 - 1) / (4 - 1 + 3) = 1/3 and the resampled value is correct 1/4 of the time.
+    assert (x == y).mean() == approx(1.0 / 3.0 + 2.0 / 3.0 / 4.0, abs=0.03)
+
+    x = np.array(["a", "b"] * 10)
+    y = mechanisms.finite_categorical(x, ["a", "b", "long value"], epsilon=0.1)
+    assert set(y.tolist()) <= {"a", "b", "long value"}
+    assert (mechanisms.finite_categorical(x, ["a", "b"], epsilon=float("inf")) == x).all()
+
+def test_finite_categorical_encodings():
+    domain = ["domain%s.com" % i for i in range(1000)]
+    x = np.array(domain)[np.random.randint(0, 10, size=500)]
+    codes, values = mechanisms.encode_categorical(x, domain)
+    assert (values[codes] == x).all()
+
+    bits = mechanisms.finite_categorical(x, domain, epsilon=1.0, encoding="unary")
+    assert bits.shape == (500, 125)
+    assert np.unpackbits(bits, axis=1, count=1000).shape == (500, 1000)
+
+    reports = mechanisms.finite_categorical(x, domain, epsilon=1.0, encoding="hashing")
+    assert reports.shape == (500, 3)
+    assert (reports[:, 2] < mechanisms.hashing_range(1.0, 1000)).all()
+
+def test_hashing_range():
+    assert mechanisms.hashing_range(1.0) == 4
+    assert mechanisms.hashing_range(1.0, 10) == 4
+    assert mechanisms.hashing_range(10.0, 10) == 10
+    assert mechanisms.hashing_range(1000.0, 10) == 10
+    assert mechanisms.hashing_range(float("inf"), 10) == 10
+    assert mechanisms.hashing_range(float("inf"), 1) == 2
+    assert mechanisms.hashing_range(float("inf")) == mechanisms.HASH_PRIME
+
+    # Without noise, the hashes of each value match the true bucket.
+    x = np.random.randint(0, 10, size=1000)
+    reports = mechanisms.finite_categorical(x, range(10), epsilon=float("inf"), encoding="hashing")
+    support = np.array([(mechanisms.local_hash(reports[:, 0], reports[:, 1], i, 10) == reports[:, 2]).sum() for i in range(10)])
+    frequencies = mechanisms.estimate_frequencies(support, len(x), 10, float("inf"), encoding="hashing")
+    assert np.allclose(frequencies, np.bincount(x, minlength=10) / len(x), atol=0.1)
@@ -0,0 +1,18 @@
+import numpy as np
+from pytest import approx
+from tiresias.core.preprocessing import clip_norms, clip_columns
+
+def test_clip_norms():
+    X = np.array([[3.0, 4.0], [0.3, 0.4], [6.0, 8.0]])
+    original = X.copy()
+    clipped = clip_norms(X, 1.0)
+    assert (X == original).all()
+    assert np.linalg.norm(clipped, axis=1) == approx([1.0, 0.5, 1.0], abs=1e-4)
+    assert clipped[0] == approx([0.6, 0.8], abs=1e-4)
+    assert clip_norms(X, 100.0) is X
+
+def test_clip_columns():
+    X = np.array([[-1.0, 5.0], [0.5, 0.5]])
+    clipped = clip_columns(X, [(0.0, 1.0), (0.0, 2.0)])
+    assert clipped.tolist() == [[0.0, 2.0], [0.5, 0.5]]
+    assert X[0, 0] == -1.0
@@ -0,0 +1,40 @@
+import numpy as np
+from pytest import approx, raises
+from tiresias.core.sensitivity import median_smooth_sensitivity
+
+def _reference_sensitivity(x, beta):
+    x = np.sort(x)
+    m = (len(x) + 1) // 2
+    smooth_sensitivity = []
+    for k in range(0, len(x)-m):
+        local_sensitivity = max(x[m+t] - x[m+t-k-1] for t in range(0, k+1))
+        smooth_sensitivity.append(np.exp(-k * beta) * local_sensitivity)
+    return max(smooth_sensitivity)
+
+def test_median_smooth_sensitivity():
+    for n in range(2, 60):
+        for beta in [0.001, 0.05, 0.5, 5.0]:
+            x = np.sort(np.random.exponential(size=n) * 10.0)
+            assert median_smooth_sensitivity(x, beta) == approx(_reference_sensitivity(x, beta))
+
+def test_median_smooth_sensitivity_constant():
+    assert median_smooth_sensitivity(np.ones(10), 0.1) == 0.0
+
+def test_median_smooth_sensitivity_too_small():
+    with raises(ValueError):
+        median_smooth_sensitivity(np.ones(1), 0.1)
+
+def test_median_smooth_sensitivity_ties():
+    for n in range(2, 40):
+        x = np.sort(np.random.randint(0, 4, size=n)).astype(float)
+        assert median_smooth_sensitivity(x, 0.01) == approx(_reference_sensitivity(x, 0.01))
+
+def test_median_smooth_sensitivity_large():
+    # Without any decay, the best `j` for each `i` is the furthest one.
+    n = 1000001
+    x = np.sort(np.random.exponential(size=n))
+    m = (n + 1) // 2
+    i = np.arange(2 * m - n, m)
+    expected = np.max(x[np.minimum(n - 1, i + n - m)] - x[i])
+    assert median_smooth_sensitivity(x, 0.0) == approx(expected)
+    assert median_smooth_sensitivity(x, 1e-9) == approx(expected, rel=1e-3)
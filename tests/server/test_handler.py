@@ -1,4 +1,5 @@
 import torch
+import pytest
 from random import random, choice
 from pytest import approx
 import tiresias.client as client
@@ -17,6 +18,81 @@ def test_handle_basic():
     result = handler.handle_basic(task, data)
     assert result == approx(0.5, abs=0.1)
 
+def test_handle_basic_accumulator():
+    task = {
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "featurizer": "SELECT * FROM dummy",
+        "aggregator": "mean",
+        "bounds": [0.0, 1.0]
+    }
+    data = handler.create_payloads(task)
+    for _ in range(100):
+        data.append([random(), 2.0 * random() - 0.5])
+    assert len(data) == 100
+    result = handler.handle_basic(task, data)
+    assert result == approx(0.5, abs=0.1)
+
+    task["aggregator"] = "count"
+    assert handler.handle_basic(task, data) == approx(200, abs=5)
+
+def test_handle_basic_accumulator_count_strings():
+    task = {
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "featurizer": "SELECT domain FROM browsing.history",
+        "aggregator": "count"
+    }
+    data = handler.create_payloads(task)
+    for _ in range(50):
+        data.append(["google.com", "mit.edu"])
+    assert len(data) == 50
+    assert handler.handle_basic(task, data) == approx(100, abs=5)
+
+def test_handle_bounded_summary():
+    from tiresias.client.handler import handle_bounded
+    for encoding in ["direct", "unary", "hashing"]:
+        task = {
+            "type": "bounded",
+            "epsilon": 2.0,
+            "aggregator": "summary",
+            "featurizer": "SELECT * FROM dummy",
+            "bounds": {
+                "x": {"type": "set", "values": ["a", "b", "c", "d"], "default": "a", "encoding": encoding},
+                "y": {"type": "range", "low": 0.0, "high": 1.0},
+            }
+        }
+        data = handler.create_payloads(task)
+        for _ in range(1000):
+            data.append(handle_bounded(task, [{"x": choice("aab"), "y": 0.25}] * 4))
+        assert len(data) == 1000
+
+        # A rejected payload doesn't change any of the columns.
+        for payload in [[{"y": 1e9, "x": [1, 2]}], [{"x": handle_bounded(task, [{"x": "a"}])[0]["x"], "y": float("nan")}]]:
+            with pytest.raises((TypeError, ValueError)):
+                data.append(payload)
+        assert len(data) == 1000
+
+        result = handler.handle_bounded(task, data.copy())
+        assert result["y"]["count"] == 4000
+        assert result["x"]["count"] == 4000
+        assert result["y"]["mean"] == approx(0.25, abs=0.05)
+        frequencies = result["x"]["frequencies"]
+        assert frequencies["a"] == approx(2.0 / 3.0, abs=0.1)
+        assert frequencies["b"] == approx(1.0 / 3.0, abs=0.1)
+        assert frequencies["c"] == approx(0.0, abs=0.1)
+
+    # Values which aren't in the domain can't be decoded so they aren't counted.
+    task["bounds"]["x"]["encoding"] = "direct"
+    data = handler.create_payloads(task)
+    data.append([{"x": "a"}, {"x": "unknown"}])
+    assert handler.handle_bounded(task, data)["x"]["count"] == 1
+
+    task["aggregator"] = None
+    assert len(handler.handle_bounded(task, [[{"x": "a"}], [{"x": "b"}]])) == 2
+
 def test_handle_integrated():
     task = {
         "type": "integrated",
@@ -68,6 +144,26 @@ def test_handle_integrated_3():
     result = handler.handle_integrated(task, data)
     assert result.predict
 
+def test_handle_integrated_columnar():
+    task = {
+        "type": "integrated",
+        "epsilon": 10.0,
+        "featurizer": "SELECT x1, x2, y FROM profile.example",
+        "model": "LogisticRegression",
+        "inputs": ["x0", "x1"],
+        "output": "y"
+    }
+    # Payloads can either be lists of rows or dictionaries of columns.
+    data = [{
+        "x0": [random() for _ in range(10)],
+        "x1": [random() for _ in range(10)],
+        "y": [choice([0, 1]) for _ in range(10)],
+    } for _ in range(10)]
+    data.append([{"x0": random(), "x1": random(), "y": 1}])
+    data.append({"x0": [], "x1": [], "y": []})
+    result = handler.handle_integrated(task, data)
+    assert result.predict
+
 def test_handle_gradient():
     task = {
         "type": "gradient",
@@ -1,9 +1,10 @@
 import threading
 from time import sleep
 from random import random
-from pytest import approx
+from pytest import approx, raises
 from tiresias.core import b64_decode
-from tiresias.server.platform import Platform, State
+from tiresias.server.platform import Platform, Scheduler, State
+from tiresias.server.store import SQLiteStore
 
 def test_platform_basic():
     platform = Platform()
@@ -90,3 +91,219 @@ def test_platform_integrated():
     assert task["status"] == State.COMPLETE
     assert b64_decode(task["result"]).predict
 
+def test_platform_integrated_validation():
+    platform = Platform()
+    task_id = platform.create({
+        "type": "integrated",
+        "epsilon": 10.0,
+        "featurizer": "SELECT x1, x2, y FROM profile.example",
+        "model": "LinearRegression",
+        "inputs": ["x0", "x1"],
+        "output": "y",
+        "min_count": 2
+    })
+    assert platform.submit(task_id, [{"x0": 1.0, "x1": 0.0, "y": 1.0}])
+    assert platform.submit(task_id, {"x0": [1.0, 2.0], "x1": [0.0, 1.0], "y": [1.0, 0.0]})
+    for payload in ["not rows", [{"x0": 1.0, "y": 1.0}], [{"x0": "a", "x1": 0.0, "y": 1.0}],
+            {"x0": [1.0, 2.0], "x1": [0.0], "y": [1.0, 0.0]}]:
+        with raises(ValueError):
+            platform.submit(task_id, payload)
+    assert platform.fetch(task_id)["count"] == 2
+
+def test_platform_count_strings():
+    platform = Platform()
+    task_id = platform.create({
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "min_count": 20,
+        "featurizer": "SELECT domain FROM browsing.history",
+        "aggregator": "count"
+    })
+    for _ in range(20):
+        assert platform.submit(task_id, ["google.com", "mit.edu"])
+
+    platform.run()
+    task = platform.fetch(task_id)
+    assert task["status"] == State.COMPLETE
+    assert b64_decode(task["result"]) == approx(40, abs=5)
+    platform.shutdown()
+
+def test_platform_scheduler_limits():
+    platform = Platform(Scheduler(limits={"basic": 1}))
+
+    task_ids = []
+    for _ in range(3):
+        task_ids.append(platform.create({
+            "type": "basic",
+            "epsilon": 16.0,
+            "delta": 1e-5,
+            "min_count": 20,
+            "featurizer": "SELECT * FROM dummy",
+            "aggregator": "mean"
+        }))
+        for _ in range(20):
+            assert platform.submit(task_ids[-1], [random()])
+
+    platform.run()
+    for task_id in task_ids:
+        assert platform.fetch(task_id)["status"] == State.COMPLETE
+
+    metrics = platform.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["completed"]["basic"] == 3
+    assert metrics["tasks"][State.COMPLETE] == 3
+    platform.shutdown()
+
+def _create_basic_task(platform):
+    task_id = platform.create({
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "min_count": 20,
+        "featurizer": "SELECT * FROM dummy",
+        "aggregator": "mean"
+    })
+    for _ in range(20):
+        assert platform.submit(task_id, [random()])
+    return task_id
+
+def test_platform_broken_process_pool():
+    scheduler = Scheduler(max_processes=1, process_types=("basic",))
+    platform = Platform(scheduler)
+    try:
+        # Kill the worker of the process pool so that it's broken.
+        executor = scheduler._executor("basic")
+        executor.submit(int).result()
+        for process in list(executor._processes.values()):
+            process.kill()
+            process.join()
+
+        task_id = _create_basic_task(platform)
+        platform.run()
+        assert platform.fetch(task_id)["status"] == State.ERROR
+        assert "BrokenProcessPool" in platform.fetch(task_id)["result"]
+        assert platform.metrics()["running"] == {}
+
+        # The next task gets a new pool.
+        task_id = _create_basic_task(platform)
+        platform.run()
+        assert platform.fetch(task_id)["status"] == State.COMPLETE
+        assert scheduler._processes is not executor
+    finally:
+        platform.shutdown()
+
+def test_platform_wait_and_gc():
+    platform = Platform()
+    task_id = platform.create({
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "min_count": 5,
+        "featurizer": "SELECT * FROM dummy",
+        "aggregator": "mean"
+    })
+    assert not platform.wait(timeout=0.01)
+
+    for _ in range(5):
+        assert platform.submit(task_id, [random()])
+    assert platform.wait(timeout=0.01)
+
+    platform.run()
+    assert not platform.wait(timeout=0.01)
+    assert platform.fetch(task_id)["status"] == State.COMPLETE
+
+    platform.gc(timeout=60)
+    assert task_id in platform.tasks()
+    platform.gc(timeout=0)
+    assert task_id not in platform.tasks()
+
+def test_platform_sqlite_store(tmpdir):
+    path = str(tmpdir.join("platform.db"))
+    platform = Platform(store=SQLiteStore(path, batch_size=8))
+    task_id = platform.create({
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "min_count": 20,
+        "featurizer": "SELECT * FROM dummy",
+        "aggregator": "median"
+    })
+    for _ in range(10):
+        assert platform.submit(task_id, [random()])
+    platform.shutdown()
+
+    platform = Platform(store=SQLiteStore(path, batch_size=8))
+    assert platform.fetch(task_id)["count"] == 10
+    for _ in range(10):
+        assert platform.submit(task_id, [random()])
+    platform.run()
+    task = platform.fetch(task_id)
+    assert task["status"] == State.COMPLETE
+    assert b64_decode(task["result"]) == approx(0.5, abs=0.2)
+    platform.shutdown()
+
+def test_platform_sqlite_store_durable(tmpdir):
+    path = str(tmpdir.join("platform.db"))
+    store = SQLiteStore(path)
+    platform = Platform(store=store)
+    task_id = platform.create({
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "min_count": 20,
+        "featurizer": "SELECT * FROM dummy",
+        "aggregator": "median"
+    })
+    count_id = platform.create({
+        "type": "basic",
+        "epsilon": 16.0,
+        "delta": 1e-5,
+        "min_count": 20,
+        "featurizer": "SELECT * FROM dummy",
+        "aggregator": "count"
+    })
+    for _ in range(5):
+        assert platform.submit(task_id, [random()])
+        assert platform.submit(count_id, [random(), random()])
+
+    # The acknowledged payloads are on disk without closing the store (i.e. after a crash).
+    recovered = Platform(store=SQLiteStore(path))
+    assert recovered.fetch(task_id)["count"] == 5
+    assert recovered.fetch(count_id)["count"] == 5
+    assert len(recovered._store.payloads(count_id)) == 5
+    assert recovered._store.payloads(count_id).nb_values == 10
+
+    # The accumulated task only stores the state of its accumulator.
+    assert store._connection.execute("SELECT COUNT(*) FROM payloads WHERE task_id = ?", (count_id,)).fetchone()[0] == 0
+    platform.shutdown()
+    recovered.shutdown()
+
+def test_platform_changes():
+    platform = Platform()
+    cursor, tasks = platform.changes(0, timeout=0.0)
+    assert tasks == {}
+
+    task = {"type": "basic", "epsilon": 16.0, "delta": 1e-5, "min_count": 10, "featurizer": "SELECT 1", "aggregator": "mean"}
+    task_id = platform.create(dict(task))
+    cursor, tasks = platform.changes(cursor, timeout=1.0)
+    assert tasks[task_id]["status"] == State.PENDING
+    assert tasks[task_id]["featurizer"] == "SELECT 1"
+
+    # Submitting payloads doesn't change the state of the task.
+    assert platform.submit(task_id, [0.5])
+    assert platform.changes(cursor, timeout=0.0) == (cursor, {})
+
+    # Block until another thread creates a task.
+    timer = threading.Timer(0.1, lambda: platform.create(dict(task)))
+    timer.start()
+    new_cursor, tasks = platform.changes(cursor, timeout=5.0)
+    timer.join()
+    assert new_cursor > cursor and len(tasks) == 1 and task_id not in tasks
+
+    for _ in range(10):
+        platform.submit(task_id, [random()])
+    platform.run()
+    _, tasks = platform.changes(new_cursor, timeout=0.0)
+    assert tasks[task_id] == {"id": task_id, "status": State.COMPLETE, "version": tasks[task_id]["version"]}
+    platform.shutdown()
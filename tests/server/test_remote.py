@@ -0,0 +1,82 @@
+import pytest
+import urllib3
+import requests
+from tiresias.server import remote
+
+class _FailingSession(object):
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def _session(monkeypatch, errors, **kwargs):
+    delays = []
+    monkeypatch.setattr(remote, "sleep", delays.append)
+    monkeypatch.setattr(remote, "random", lambda: 1.0)
+    session = remote.Session(**kwargs)
+    session._session = _FailingSession(errors)
+    return session, delays
+
+def test_session_retry(monkeypatch):
+    errors = [requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout()]
+    session, delays = _session(monkeypatch, errors, max_retries=3, backoff=0.1)
+    assert session.get("http://localhost/", "/list") == "ok"
+    assert session._session.calls == 3
+    assert delays == [0.1, 0.2]
+
+def test_session_backoff(monkeypatch):
+    errors = [requests.exceptions.ConnectionError()] * 5
+    session, delays = _session(monkeypatch, errors, max_retries=4, backoff=1.0, max_backoff=3.0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get("http://localhost/", "/list")
+    assert session._session.calls == 5
+    assert delays == [1.0, 2.0, 3.0, 3.0]
+
+def test_session_post(monkeypatch):
+    # A POST which timed out may have been processed by the server so it isn't retried...
+    session, delays = _session(monkeypatch, [requests.exceptions.ReadTimeout()])
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        session.post("http://localhost/", "/submit")
+    assert session._session.calls == 1
+
+    # ...nor when the connection was dropped after it was sent...
+    session, delays = _session(monkeypatch, [requests.exceptions.ConnectionError()])
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.post("http://localhost/", "/submit")
+    assert session._session.calls == 1
+
+    # ...unless it never reached the server.
+    refused = urllib3.exceptions.MaxRetryError(None, "/submit", urllib3.exceptions.NewConnectionError(None, "refused"))
+    errors = [requests.exceptions.ConnectTimeout(), requests.exceptions.ConnectionError(refused)]
+    session, delays = _session(monkeypatch, errors)
+    assert session.post("http://localhost/", "/submit") == "ok"
+    assert session._session.calls == 3
+
+def test_session_no_retries(monkeypatch):
+    session, delays = _session(monkeypatch, [], max_retries=0)
+    assert session.get("http://localhost/", "/list") == "ok"
+    session, delays = _session(monkeypatch, [requests.exceptions.ConnectionError()], max_retries=0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get("http://localhost/", "/list")
+    assert session._session.calls == 1
+    assert delays == []
+
+def test_configure(monkeypatch):
+    previous = remote._session
+    closed = []
+    monkeypatch.setattr(previous, "close", lambda: closed.append(True))
+    try:
+        remote.configure(pool_size=2, timeout=5.0, max_retries=1)
+        assert remote._session is not previous
+        assert remote._session.timeout == 5.0
+        assert remote._session.max_retries == 1
+        # The previous session is left open for the threads which may still be using it.
+        assert not closed
+    finally:
+        remote._session = previous
@@ -0,0 +1,118 @@
+import json
+import torch
+import threading
+from time import time, sleep
+from random import randint
+from tiresias.core import b64_encode, b64_decode, codec
+from tiresias.server import remote
+from tiresias.benchmark.load import start_server, stop_server
+
+TEST_PORT = 9000 + randint(0, 1000)
+SERVER = "http://localhost:%s/" % TEST_PORT
+
+def _wait(task_id, timeout=30.0):
+    start = time()
+    while time() - start < timeout:
+        task = remote.fetch_task(SERVER, task_id)
+        if task["status"] in ("COMPLETE", "ERROR"):
+            return task
+        sleep(0.1)
+    return task
+
+def test_server():
+    server = start_server(TEST_PORT)
+    try:
+        # POST /task
+        basic_id = remote.create_task(SERVER, {
+            "type": "basic",
+            "epsilon": 1.0,
+            "min_count": 3,
+            "featurizer": "SELECT x FROM example.table",
+            "aggregator": "mean",
+            "bounds": [0.0, 1.0],
+        })
+        model = torch.nn.Linear(2, 1)
+        gradient_task = {
+            "type": "gradient",
+            "epsilon": 1.0,
+            "delta": 1e-5,
+            "min_count": 2,
+            "lr": 0.01,
+            "featurizer": "SELECT x0, x1, y FROM example.table",
+            "model": b64_encode(model),
+            "loss": b64_encode(torch.nn.functional.mse_loss),
+            "inputs": ["x0", "x1"],
+            "output": ["y"],
+        }
+        gradient_id = remote.create_task(SERVER, gradient_task)
+        assert remote.fetch_task(SERVER, basic_id)["status"] == "PENDING"
+
+        # POST /task/<id>/submit with a JSON and a binary payload
+        assert json.loads(remote.approve_task(SERVER, basic_id, [0.5]).text)
+        for _ in range(2):
+            payload = codec.encode([torch.ones(1, 2), torch.ones(1)])
+            assert json.loads(remote.approve_task(SERVER, gradient_id, payload).text)
+        task = _wait(gradient_id)
+        assert task["status"] == "COMPLETE"
+        assert not torch.equal(b64_decode(task["result"]).weight, model.weight)
+
+        # POST /submit rejects the bad items without failing the rest of the batch
+        pending_id = remote.create_task(SERVER, gradient_task)
+        accepted = remote.approve_tasks(SERVER, {
+            basic_id: [0.25],
+            pending_id: "not a gradient",
+            "unknown": [1.0],
+        })
+        assert accepted == {basic_id: True, pending_id: False, "unknown": False}
+        wrong_shape = codec.encode([torch.ones(2, 2), torch.ones(1)])
+        assert remote.approve_task(SERVER, pending_id, wrong_shape).status_code == 400
+        assert remote.fetch_task(SERVER, pending_id)["count"] == 0
+        accepted = remote.approve_tasks(SERVER, {basic_id: [["not", "a", "number"]]})
+        assert accepted == {basic_id: False}
+        assert remote.fetch_task(SERVER, basic_id)["count"] == 2
+        assert remote.approve_tasks(SERVER, {basic_id: [1.0]}) == {basic_id: True}
+        assert _wait(basic_id)["status"] == "COMPLETE"
+    finally:
+        stop_server(server)
+
+def test_server_long_poll():
+    port = TEST_PORT + 1
+    server_url = "http://localhost:%s/" % port
+    server = start_server(port, threads=8)
+    session = remote.Session(pool_size=32)
+    try:
+        # There are more pollers than workers; the ones which can't wait are answered right away.
+        cursor = json.loads(session.get(server_url, "/list", params={"since": 0, "timeout": 0.0}).text)["cursor"]
+        results = []
+        def _poll():
+            start = time()
+            params = {"since": cursor, "timeout": 10.0}
+            obj = json.loads(session.get(server_url, "/list", params=params, timeout=30.0).text)
+            results.append((time() - start, obj["tasks"]))
+        pollers = [threading.Thread(target=_poll) for _ in range(16)]
+        for poller in pollers:
+            poller.start()
+        sleep(1.0)
+        assert len(results) >= 12
+
+        # The remaining workers are still available for the other requests.
+        start = time()
+        task_id = session.post(server_url, "/task", json={
+            "type": "basic",
+            "epsilon": 1.0,
+            "min_count": 3,
+            "featurizer": "SELECT x FROM example.table",
+            "aggregator": "mean",
+        }).text
+        assert json.loads(session.get(server_url, "/list").text).keys() == {task_id}
+        assert time() - start < 2.0
+
+        # The waiting pollers are woken up by the new task.
+        for poller in pollers:
+            poller.join(10.0)
+        assert len(results) == 16
+        assert sum(1 for _, tasks in results if task_id in tasks) >= 1
+        assert max(latency for latency, _ in results) < 5.0
+    finally:
+        session.close()
+        stop_server(server)
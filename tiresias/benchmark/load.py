@@ -0,0 +1,336 @@
+"""
+This module load tests the server on the local machine. It starts a server in
+a separate process, creates a set of tasks of each type and has a number of
+virtual clients submit their payloads concurrently. The report contains the
+submit throughput, the request latency percentiles, the task completion
+latency and the memory used by the server (including its worker processes)
+over time.
+
+```
+python -m tiresias.benchmark.load --nb_clients 200 --nb_tasks 2 --output load
+```
+
+The payloads are computed ahead of time with the client-side handlers on
+random data so that the benchmark measures the server rather than the
+featurizers.
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import requests
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+from time import time, sleep
+from concurrent.futures import ThreadPoolExecutor
+from tiresias.core import b64_encode, codec
+from tiresias.server import remote
+from tiresias.client.handler import handle_basic, handle_bounded, handle_integrated, handle_gradient
+
+TASK_TYPES = ("basic", "bounded", "integrated", "gradient")
+
+def make_task(task_type, min_count):
+    """
+    Create a task of the given type which completes after `min_count` payloads.
+    """
+    task = {
+        "name": "Load test (%s)" % task_type,
+        "type": task_type,
+        "epsilon": 1.0,
+        "delta": 1e-5,
+        "min_count": min_count,
+        "featurizer": "SELECT x0, x1, y FROM benchmark.example",
+    }
+    if task_type == "basic":
+        task.update(featurizer="SELECT x0 FROM benchmark.example", aggregator="mean")
+    elif task_type == "bounded":
+        task["bounds"] = {
+            "x0": {"type": "range", "low": 0.0, "high": 1.0},
+            "x1": {"type": "range", "low": 0.0, "high": 1.0},
+            "y": {"type": "set", "values": [0, 1], "default": 0},
+        }
+    elif task_type == "integrated":
+        task.update(model="LinearRegression", inputs=["x0", "x1"], output="y")
+    elif task_type == "gradient":
+        import torch
+        task.update(
+            model=b64_encode(torch.nn.Sequential(torch.nn.Linear(2, 1))),
+            loss=b64_encode(torch.nn.functional.mse_loss),
+            inputs=["x0", "x1"],
+            output=["y"],
+            lr=0.01,
+        )
+    return task
+
+def make_payloads(task, nb_payloads, nb_rows=10, seed=None):
+    """
+    Compute `nb_payloads` payloads for the task, each one containing `nb_rows` random rows. The
+    payloads are encoded ahead of time (as JSON, except for the gradients which are already
+    encoded by `tiresias.core.codec`) so the clients only measure the request.
+    """
+    rng = np.random.default_rng(seed)
+    dispatcher = {
+        "basic": handle_basic,
+        "bounded": handle_bounded,
+        "integrated": handle_integrated,
+        "gradient": handle_gradient,
+    }
+    payloads = []
+    for _ in range(nb_payloads):
+        x = rng.random((nb_rows, 2))
+        y = (x.sum(axis=1) > 1.0).astype(int)
+        data = [{"x0": x0, "x1": x1, "y": label} for (x0, x1), label in zip(x.tolist(), y.tolist())]
+        if task["type"] == "basic":
+            data = [{"x0": row["x0"]} for row in data]
+        payload = dispatcher[task["type"]](task, data)
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload, default=lambda x: x.item()).encode("utf-8")
+        payloads.append(payload)
+    return payloads
+
+def _rss(pid):
+    try:
+        with open("/proc/%s/statm" % pid) as fin:
+            return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _descendants(pid):
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % name) as fin:
+                # The command name may contain spaces so the fields are counted from its end.
+                ppid = int(fin.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+    pids, stack = [], list(children.get(pid, []))
+    while stack:
+        pids.append(stack.pop())
+        stack.extend(children.get(pids[-1], []))
+    return pids
+
+def memory_usage(pid, children=True):
+    """
+    Return the resident set size of the process (and, if `children` is set, of all of its
+    descendants such as the process pool workers) in bytes or None if it can't be read; this
+    requires the `/proc` filesystem. Pages shared between the processes are counted once per
+    process.
+    """
+    rss = _rss(pid)
+    if rss is None or not children:
+        return rss
+    return rss + sum(_rss(child) or 0 for child in _descendants(pid))
+
+def start_server(port, timeout=30.0, threads=64):
+    """
+    Start the server with `threads` request workers in a new process group and wait until it
+    accepts requests; use `stop_server` to terminate it along with the process pool which runs
+    the model fitting tasks.
+    """
+    command = [sys.executable, "-c", "import tiresias.server; tiresias.server.run(%d, threads=%d)" % (port, threads)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    session = remote.Session(max_retries=0, timeout=1.0)
+    start = time()
+    try:
+        while True:
+            try:
+                session.get("http://localhost:%s/" % port, "/list")
+                return process
+            except requests.exceptions.RequestException:
+                if process.poll() is not None or time() - start > timeout:
+                    stop_server(process)
+                    raise RuntimeError("The server failed to start on port %s." % port)
+                sleep(0.1)
+    finally:
+        session.close()
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else None
+
+class LoadTest(object):
+
+    def __init__(self, server_url=None, port=3000, nb_clients=100, nb_tasks=1, task_types=TASK_TYPES,
+            nb_rows=10, nb_payloads=16, interval=0.5, timeout=120.0):
+        """
+        The LoadTest creates `nb_tasks` tasks of each of the `task_types` and has each of the
+        `nb_clients` virtual clients submit one payload to every task; each task completes once all
+        the clients have contributed. The payloads contain `nb_rows` rows and `nb_payloads` distinct
+        payloads are computed per task.
+
+        If `server_url` is None, a server is started on `port` for the duration of the test and
+        its memory usage is sampled every `interval` seconds. The test gives up on the tasks which
+        haven't completed after `timeout` seconds.
+        """
+        self.server_url = server_url
+        self.port = port
+        self.nb_clients = nb_clients
+        self.nb_tasks = nb_tasks
+        self.task_types = list(task_types)
+        self.nb_rows = nb_rows
+        self.nb_payloads = nb_payloads
+        self.interval = interval
+        self.timeout = timeout
+
+    def run(self):
+        """
+        Run the load test and return the report (see `summarize`).
+        """
+        process = None
+        server_url = self.server_url
+        if server_url is None:
+            process = start_server(self.port)
+            server_url = "http://localhost:%s/" % self.port
+        session = remote.Session(pool_size=self.nb_clients, timeout=60.0)
+        try:
+            return self._run(session, server_url, process)
+        finally:
+            session.close()
+            if process is not None:
+                stop_server(process)
+
+    def _run(self, session, server_url, process):
+        tasks = []
+        for task_type in self.task_types:
+            for i in range(self.nb_tasks):
+                task = make_task(task_type, self.nb_clients)
+                task["payloads"] = make_payloads(task, self.nb_payloads, self.nb_rows, seed=i)
+                tasks.append(task)
+
+        stop = threading.Event()
+        memory = []
+        def _sample_memory(start):
+            while not stop.is_set():
+                memory.append({"time": time() - start, "rss": memory_usage(process.pid)})
+                stop.wait(self.interval)
+
+        submits = []
+        def _client(i):
+            # Each virtual client contributes to every task in turn.
+            for task in tasks:
+                payload = task["payloads"][i % len(task["payloads"])]
+                content_type = "application/octet-stream" if codec.is_encoded(payload) else "application/json"
+                t = time()
+                response = session.post(server_url, "/task/%s/submit" % task["id"], data=payload,
+                    headers={"Content-Type": content_type})
+                submits.append({
+                    "type": task["type"],
+                    "start": t - start,
+                    "latency": time() - t,
+                    "accepted": response.status_code == 200 and json.loads(response.text),
+                })
+
+        start = time()
+        if process is not None:
+            sampler = threading.Thread(target=_sample_memory, args=(start,), daemon=True)
+            sampler.start()
+        try:
+            for task in tasks:
+                body = {k: v for k, v in task.items() if k != "payloads"}
+                task["id"] = session.post(server_url, "/task", json=body).text
+                task["created"] = time() - start
+            with ThreadPoolExecutor(self.nb_clients) as executor:
+                list(executor.map(_client, range(self.nb_clients)))
+            submitted = time() - start
+            results = self._wait(session, server_url, tasks, start)
+        finally:
+            stop.set()
+        return summarize(submits, results, memory, submitted)
+
+    def _wait(self, session, server_url, tasks, start):
+        results = {}
+        while len(results) < len(tasks) and time() - start < self.timeout:
+            for task in tasks:
+                if task["id"] in results:
+                    continue
+                obj = json.loads(session.get(server_url, "/task/%s" % task["id"]).text)
+                if obj["status"] in ("COMPLETE", "ERROR"):
+                    results[task["id"]] = {
+                        "id": task["id"],
+                        "type": task["type"],
+                        "status": obj["status"],
+                        "latency": time() - start - task["created"],
+                        "server_latency": obj["end"] - obj["start"] if "end" in obj else None,
+                    }
+            sleep(0.1)
+        for task in tasks:
+            if task["id"] not in results:
+                results[task["id"]] = {"id": task["id"], "type": task["type"], "status": "TIMEOUT",
+                    "latency": None, "server_latency": None}
+        return list(results.values())
+
+def summarize(submits, tasks, memory, duration):
+    """
+    Summarize the submit requests, completed tasks and memory samples collected over `duration`
+    seconds. The report contains a `summary` row per task type (and one for all the types) along
+    with the raw `tasks` and `memory` records.
+    """
+    summary = []
+    task_types = sorted(set(r["type"] for r in submits) | set(t["type"] for t in tasks))
+    for task_type in task_types + ["all"]:
+        latencies = [r["latency"] for r in submits if task_type in ("all", r["type"])]
+        completed = [t["latency"] for t in tasks if task_type in ("all", t["type"]) and t["status"] == "COMPLETE"]
+        summary.append({
+            "type": task_type,
+            "requests": len(latencies),
+            "accepted": sum(1 for r in submits if task_type in ("all", r["type"]) and r["accepted"]),
+            "throughput": len(latencies) / duration if duration else None,
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p99": _percentile(latencies, 99),
+            "tasks": sum(1 for t in tasks if task_type in ("all", t["type"])),
+            "completed": len(completed),
+            "completion_p50": _percentile(completed, 50),
+            "completion_max": max(completed) if completed else None,
+        })
+    rss = [m["rss"] for m in memory if m["rss"] is not None]
+    return {
+        "duration": duration,
+        "max_rss": max(rss) if rss else None,
+        "summary": summary,
+        "tasks": tasks,
+        "memory": memory,
+    }
+
+def save_report(report, prefix):
+    """
+    Write the report to `<prefix>.json` along with the summary and the memory samples as
+    `<prefix>.csv` and `<prefix>_memory.csv`.
+    """
+    with open(prefix + ".json", "wt") as fout:
+        json.dump(report, fout, indent=2)
+    pd.DataFrame(report["summary"]).to_csv(prefix + ".csv", index=False)
+    pd.DataFrame(report["memory"], columns=["time", "rss"]).to_csv(prefix + "_memory.csv", index=False)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server_url', type=str, default=None, help="Use a running server instead of starting one.")
+    parser.add_argument('--port', type=int, default=3000, help="The port for the local server.")
+    parser.add_argument('--nb_clients', type=int, default=100, help="The number of virtual clients.")
+    parser.add_argument('--nb_tasks', type=int, default=1, help="The number of tasks of each type.")
+    parser.add_argument('--task_types', type=str, default=",".join(TASK_TYPES), help="The comma-separated task types.")
+    parser.add_argument('--nb_rows', type=int, default=10, help="The number of rows in each payload.")
+    parser.add_argument('--timeout', type=float, default=120.0, help="How long to wait for the tasks to complete.")
+    parser.add_argument('--output', type=str, default="load", help="The prefix for the report files.")
+    args = parser.parse_args()
+
+    test = LoadTest(args.server_url, args.port, nb_clients=args.nb_clients, nb_tasks=args.nb_tasks,
+        task_types=args.task_types.split(","), nb_rows=args.nb_rows, timeout=args.timeout)
+    report = test.run()
+    save_report(report, args.output)
+    print(pd.DataFrame(report["summary"]).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
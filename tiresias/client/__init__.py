@@ -8,19 +8,24 @@ from random import random, randint
 from bottle import Bottle, request, response, static_file
 import tiresias.server as server
 import tiresias.server.remote
-from tiresias.client.handler import handle_task
+from tiresias.client.runner import TaskRunner
 from tiresias.client.storage import execute_sql
-from tiresias.client.storage import initialize, app_columns, register_app, insert_payload
+from tiresias.client.storage import initialize, app_columns, register_app, insert_payload, add_index
 from tiresias.client.synthetic import create_synthetic_dataset
 
-def run(server_url, storage_dir, storage_port, accept_all, synthetic):
+LONG_POLL_TIMEOUT = 10.0
+
+def run(server_url, storage_dir, storage_port, accept_all, synthetic, long_poll=False, max_workers=4, use_asyncio=False):
+    if use_asyncio:
+        import tiresias.client.aio
+        return tiresias.client.aio.run(server_url, storage_dir, storage_port, accept_all, synthetic, long_poll, max_workers)
     whitelist, blacklist = set(), set()
 
     storage_thread = threading.Thread(target=storage_server, args=(storage_dir, storage_port, server_url, whitelist, blacklist, synthetic))
     storage_thread.start()
     sleep(0.1)
 
-    handler_thread = threading.Thread(target=task_handler, args=(server_url, storage_dir, whitelist, blacklist, accept_all))
+    handler_thread = threading.Thread(target=task_handler, args=(server_url, storage_dir, whitelist, blacklist, accept_all, long_poll, max_workers))
     handler_thread.start()
     sleep(0.1)
 
@@ -81,6 +86,16 @@ def storage_server(storage_dir, storage_port, server_url, whitelist, blacklist,
         register_app(api.config['storage_dir'], app_name, schema)
         return ""
 
+    @api.route("/app/<app_name>/index")
+    def _index_app(app_name):
+        """
+        This REST endpoint allows an application to add an index on the `columns` (a JSON array) of 
+        the table specified by the `table` parameter.
+        """
+        columns = loads(request.params.get("columns"))
+        add_index(api.config['storage_dir'], app_name, request.params.get("table"), columns)
+        return ""
+
     @api.route("/app/<app_name>/insert")
     def _insert(app_name):
         """
@@ -96,26 +111,48 @@ def storage_server(storage_dir, storage_port, server_url, whitelist, blacklist,
     else:
         api.run(host="localhost", port=storage_port, quiet=True)
 
-def task_handler(server_url, storage_dir, whitelist, blacklist, accept_all):
+def task_handler(server_url, storage_dir, whitelist, blacklist, accept_all, long_poll=False, max_workers=4, timeout=600.0):
+    """
+    Fetch the pending tasks, run the ones which have been accepted and submit the results. If
+    `long_poll` is set, the handler waits on the server for changes to the task list instead of
+    polling it and only receives the tasks which have changed.
+
+    Up to `max_workers` tasks are executed concurrently and their results are submitted as they
+    complete; see `TaskRunner`. Tasks which are no longer pending on the server are cancelled.
+    """
+    runner = TaskRunner(server_url, storage_dir, max_workers=max_workers, timeout=timeout)
     processed = set()
+    pending, cursor = {}, 0
     while True:
         try:
-            tasks = server.remote.list_tasks(server_url)
+            if long_poll:
+                cursor, changes = server.remote.poll_tasks(server_url, cursor, timeout=LONG_POLL_TIMEOUT)
+                for id, task in changes.items():
+                    if task["status"] == "PENDING":
+                        pending[id] = task
+                    else:
+                        pending.pop(id, None)
+                tasks = pending
+            else:
+                tasks = server.remote.list_tasks(server_url)
+            for id in runner.running():
+                if id not in tasks:
+                    runner.cancel(id)
             for id, task in tasks.items():
                 if id in processed or id in blacklist:
                     continue
                 if id in whitelist or accept_all:
-                    result, err = handle_task(storage_dir, task)
-                    if not err:
-                        server.remote.approve_task(server_url, id, result)
-                    else:
-                        print(err)
+                    runner.submit(task)
                     processed.add(id)
                     whitelist.add(id)
-        except requests.exceptions.ConnectionError:
+            runner.flush()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             print("The server at %s is offline; retrying in 1s." % server_url)
             sleep(1.0)
-        sleep(0.5 + random())
+            continue
+        # The server answers long polls right away when it's busy, so back off if nothing changed.
+        if not long_poll or not changes:
+            sleep(0.5 + random())
 
 def create_dummy_dataset(storage_dir):
     from sklearn.datasets import load_wine
@@ -0,0 +1,244 @@
+"""
+This module provides an asyncio runtime for the client in which the storage
+API, the task polling and the result submission share a single event loop and
+use non-blocking HTTP. Since each `Device` only holds a few coroutines, a
+single process can host many of them (see `tiresias.client.simulation`). This
+runtime requires `aiohttp`.
+"""
+import os
+import asyncio
+from json import loads, dumps
+from random import random
+from tiresias.client.handler import handle_task
+from tiresias.client.storage import initialize, app_columns, register_app, insert_payload, add_index, execute_sql
+from tiresias.client.storage import release
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:
+    aiohttp = None
+
+def _run_in_thread(func, *args):
+    # The equivalent of `asyncio.to_thread` (which requires Python 3.9) on the default executor.
+    return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+class Device(object):
+
+    def __init__(self, server_url, storage_dir, accept_all=False, long_poll=False, max_workers=4, timeout=600.0, executor=None, keep_connections=True):
+        """
+        The Device polls the server for tasks, executes the ones which have been accepted (up to
+        `max_workers` at a time, on the given executor or the default thread pool) and submits
+        their results. This is the asyncio equivalent of `tiresias.client.task_handler` and
+        `tiresias.client.runner.TaskRunner`. If `keep_connections` is False, the SQLite connections are
+        closed and the cached results dropped after each task (see `tiresias.client.storage.release`)
+        instead of being kept by the worker thread.
+        """
+        self.server_url = server_url
+        self.storage_dir = storage_dir
+        self.accept_all = accept_all
+        self.long_poll = long_poll
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.executor = executor
+        self.keep_connections = keep_connections
+        self.whitelist, self.blacklist = set(), set()
+        self.nb_submitted = 0
+        self._processed = set()
+        self._running = {}
+        self._pending, self._cursor, self._idle = {}, 0, False
+        self._semaphore = None
+
+    async def list_tasks(self, session):
+        """
+        Fetch the pending tasks from the server.
+        """
+        if not self.long_poll:
+            async with session.get(self.server_url + "list") as response:
+                return loads(await response.text())
+
+        from tiresias.client import LONG_POLL_TIMEOUT
+        params = {"since": self._cursor, "timeout": LONG_POLL_TIMEOUT}
+        timeout = aiohttp.ClientTimeout(total=LONG_POLL_TIMEOUT + 30.0)
+        async with session.get(self.server_url + "list", params=params, timeout=timeout) as response:
+            obj = loads(await response.text())
+        self._cursor = obj["cursor"]
+        self._idle = not obj["tasks"]
+        for task_id, task in obj["tasks"].items():
+            if task["status"] == "PENDING":
+                self._pending[task_id] = task
+            else:
+                self._pending.pop(task_id, None)
+        return dict(self._pending)
+
+    async def poll(self, session):
+        """
+        Fetch the pending tasks once, start executing the accepted ones and cancel the ones which
+        are no longer pending.
+        """
+        return self.dispatch(session, await self.list_tasks(session))
+
+    def dispatch(self, session, tasks):
+        """
+        Start executing the accepted tasks and cancel the running tasks which are no longer pending,
+        where `tasks` contains all the pending tasks.
+        """
+        for task_id in list(self._running):
+            if task_id not in tasks:
+                self._running.pop(task_id).cancel()
+        for task_id, task in tasks.items():
+            if task_id in self._processed or task_id in self.blacklist:
+                continue
+            if task_id in self.whitelist or self.accept_all:
+                self._processed.add(task_id)
+                self.whitelist.add(task_id)
+                self._running[task_id] = asyncio.ensure_future(self.execute(session, task))
+        return tasks
+
+    async def execute(self, session, task):
+        """
+        Execute the task and submit the result. Returns whether the result was accepted.
+        """
+        if self._semaphore is None:
+            # Before Python 3.10 the semaphore is bound to the event loop which is running when
+            # it's created, so it can't be created in the constructor.
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        try:
+            async with self._semaphore:
+                future = asyncio.get_running_loop().run_in_executor(self.executor, self._handle_task, task)
+                result, err = await asyncio.wait_for(future, self.timeout)
+            if err:
+                print(err)
+                return False
+            url = self.server_url + "task/%s/submit" % task["id"]
+            if isinstance(result, (bytes, bytearray)):
+                request = session.post(url, data=result, headers={"Content-Type": "application/octet-stream"})
+            else:
+                request = session.post(url, json=result)
+            async with request as response:
+                accepted = loads(await response.text())
+            self.nb_submitted += bool(accepted)
+            return accepted
+        except asyncio.TimeoutError:
+            print("Task %s timed out after %ss." % (task["id"], self.timeout))
+            return False
+        finally:
+            if self._running.get(task["id"]) is asyncio.current_task():
+                del self._running[task["id"]]
+
+    def _handle_task(self, task):
+        try:
+            return handle_task(self.storage_dir, task)
+        finally:
+            if not self.keep_connections:
+                release(self.storage_dir)
+
+    def close(self):
+        """
+        Close the SQLite connections and drop the cached results for the storage directory.
+        """
+        release(self.storage_dir)
+
+    async def run(self, session):
+        while True:
+            try:
+                await self.poll(session)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                print("The server at %s is offline; retrying in 1s." % self.server_url)
+                await asyncio.sleep(1.0)
+                continue
+            # The server answers long polls right away when it's busy, so back off if nothing changed.
+            if not self.long_poll or self._idle:
+                await asyncio.sleep(0.5 + random())
+
+def create_storage_app(device, session):
+    """
+    Create the aiohttp application which serves the same storage API as the Bottle server in
+    `tiresias.client.storage_server`. The SQLite queries are executed on the default thread pool.
+    """
+    storage_dir = device.storage_dir
+
+    async def _index(request):
+        return web.FileResponse(os.path.join(os.path.dirname(__file__), "client.html"))
+
+    async def _tasks(request):
+        async with session.get(device.server_url + "list") as response:
+            tasks = loads(await response.text())
+        for task_id, task in tasks.items():
+            task["accepted"] = task_id in device.whitelist
+            task["rejected"] = task_id in device.blacklist
+            task["preview"] = await _run_in_thread(execute_sql, storage_dir, task["featurizer"])
+        return web.json_response(tasks)
+
+    async def _whitelist_task(request):
+        device.whitelist.add(request.match_info["task_id"])
+        device.blacklist.discard(request.match_info["task_id"])
+        return web.Response(text="")
+
+    async def _blacklist_task(request):
+        device.blacklist.add(request.match_info["task_id"])
+        return web.Response(text="")
+
+    async def _app(request):
+        rows = await _run_in_thread(app_columns, storage_dir)
+        return web.Response(text=dumps(rows, indent=2), content_type="application/json")
+
+    async def _register(request):
+        schema = loads(request.query["schema"])
+        await _run_in_thread(register_app, storage_dir, request.match_info["app_name"], schema)
+        return web.Response(text="")
+
+    async def _index_app(request):
+        columns = loads(request.query["columns"])
+        await _run_in_thread(add_index, storage_dir, request.match_info["app_name"], request.query["table"], columns)
+        return web.Response(text="")
+
+    async def _insert(request):
+        payload = loads(request.query["payload"])
+        await _run_in_thread(insert_payload, storage_dir, request.match_info["app_name"], payload)
+        return web.Response(text="")
+
+    app = web.Application()
+    app.add_routes([
+        web.get("/", _index),
+        web.get("/tasks", _tasks),
+        web.get("/whitelist/{task_id}", _whitelist_task),
+        web.get("/blacklist/{task_id}", _blacklist_task),
+        web.get("/app", _app),
+        web.get("/app/{app_name}/register", _register),
+        web.get("/app/{app_name}/index", _index_app),
+        web.get("/app/{app_name}/insert", _insert),
+    ])
+    return app
+
+async def run_async(server_url, storage_dir, storage_port, accept_all, synthetic, long_poll=False, max_workers=4):
+    from tiresias.client import create_dummy_dataset
+    from tiresias.client.synthetic import create_synthetic_dataset
+
+    def _initialize():
+        initialize(storage_dir)
+        if synthetic:
+            create_synthetic_dataset(storage_dir)
+        create_dummy_dataset(storage_dir)
+    await _run_in_thread(_initialize)
+
+    if not server_url.endswith("/"):
+        server_url += "/"
+    device = Device(server_url, storage_dir, accept_all=accept_all, long_poll=long_poll, max_workers=max_workers)
+    async with aiohttp.ClientSession() as session:
+        runner = web.AppRunner(create_storage_app(device, session))
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0" if synthetic else "localhost", storage_port).start()
+        try:
+            await device.run(session)
+        finally:
+            await runner.cleanup()
+
+def run(server_url, storage_dir, storage_port, accept_all, synthetic, long_poll=False, max_workers=4):
+    """
+    Run the storage API and the task handler on a single event loop; this takes the same arguments
+    as `tiresias.client.run`.
+    """
+    if aiohttp is None:
+        raise ImportError("The asyncio runtime requires aiohttp (pip install aiohttp).")
+    asyncio.run(run_async(server_url, storage_dir, storage_port, accept_all, synthetic, long_poll, max_workers))
@@ -4,7 +4,15 @@ from tiresias.client.handler.bounded import handle_bounded
 from tiresias.client.handler.integrated import handle_integrated
 from tiresias.client.handler.gradient import handle_gradient
 
-def handle_task(storage_dir, task):
+# The handlers which expect the featurizer output as a dictionary of columns rather than rows.
+COLUMNAR = {"integrated", "gradient"}
+
+def handle_task(storage_dir, task, readers=None):
+    """
+    Run the featurizer and pass its output to the handler for the task type. Returns a tuple
+    containing the result and the error, if any. If given, the `readers` semaphore is held while
+    the featurizer is executed to limit the number of concurrent queries.
+    """
     dispatcher = {
         "basic": handle_basic,
         "bounded": handle_bounded,
@@ -16,7 +24,11 @@ def handle_task(storage_dir, task):
     func = dispatcher[task["type"]]
 
     try:
-        data = execute_sql(storage_dir, task["featurizer"])
+        if readers is None:
+            data = execute_sql(storage_dir, task["featurizer"], columnar=task["type"] in COLUMNAR)
+        else:
+            with readers:
+                data = execute_sql(storage_dir, task["featurizer"], columnar=task["type"] in COLUMNAR)
         return func(task, data), None
     except Exception as e:
         return None, e
@@ -1,30 +1,43 @@
+import numpy as np
 from tiresias.core.mechanisms import finite_categorical, bounded_continuous
 
-def _ldp(value, bounds, epsilon):
+def _ldp(values, bounds, epsilon):
+    """
+    Apply local differential privacy to each value in the list, where the values are clipped
+    to the bounds (or replaced by the default if they aren't in the set) first. Returns a list
+    of Python objects.
+    """
     if bounds["type"] == "range":
-        value = min(max(bounds["low"], value), bounds["high"])
-        return bounded_continuous(value, bounds["low"], bounds["high"], epsilon)
+        values = np.clip(np.array(values, dtype=float), bounds["low"], bounds["high"])
+        return bounded_continuous(values, bounds["low"], bounds["high"], epsilon).tolist()
 
     elif bounds["type"] == "set":
-        if value not in bounds["values"]:
-            value = bounds["default"]
-        domain = set(bounds["values"])
-        domain.add(bounds["default"])
-        return finite_categorical(value, domain, epsilon)
+        # Perturb the indices of the values in the domain rather than the values themselves.
+        domain = list(dict.fromkeys(list(bounds["values"]) + [bounds["default"]]))
+        index = {value: i for i, value in enumerate(domain)}
+        default = index[bounds["default"]]
+        codes = np.array([index.get(value, default) for value in values], dtype=int)
+        encoding = bounds.get("encoding", "direct")
+        codes = finite_categorical(codes, range(len(domain)), epsilon, encoding)
+        if encoding != "direct":
+            return codes.tolist()
+        return [domain[i] for i in codes.tolist()]
 
-    return ValueError("Unknown bounds.")
+    raise ValueError("Unknown bounds.")
 
 def handle_bounded(task, data):
     """
-    The featurizer for a basic task is expected to produce a list of dictionaries such that the 
+    The featurizer for a basic task is expected to produce a list of dictionaries such that the
     bounds for each value is given in the task. This applies local differential privacy to each
-    value independently (e.g. so each value on its own is differentially private).
+    value independently (e.g. so each value on its own is differentially private); the values
+    are perturbed one column at a time.
+
+    For large sets, the bounds can specify an `encoding` (see `finite_categorical`) in which case
+    each value is replaced by its encoding (a list of integers) which the server decodes.
     """
-    dp_rows = []
-    for row in data:
-        dp_row = {}
-        for key, value in row.items():
-            bounds = task["bounds"][key]
-            dp_row[key] = _ldp(value, bounds, task["epsilon"])
-        dp_rows.append(dp_row)
-    return dp_rows
+    if not data:
+        return []
+    columns = {}
+    for key in data[0]:
+        columns[key] = _ldp([row[key] for row in data], task["bounds"][key], task["epsilon"])
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
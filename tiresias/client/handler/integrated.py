@@ -2,8 +2,13 @@
 def handle_integrated(task, data):
     """
     The featurizer for a basic task is expected to produce a list of dictionaries such that each 
-    dictionary contains the same set of keys.
+    dictionary contains the same set of keys. Alternatively, the featurizer output can be given as
+    a dictionary of columns (see `tiresias.client.storage.to_columns`), in which case it is sent
+    to the server as a dictionary of lists.
     """
+    if type(data) == dict:
+        assert len(set(len(values) for values in data.values())) <= 1, "Each column should have the same length."
+        return {key: values.tolist() for key, values in data.items()}
     assert type(data) == list, "Featurizers should return rows."
     keys = set(data[0].keys())
     for row in data:
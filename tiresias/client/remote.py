@@ -22,3 +22,13 @@ def insert_payload(port, app_name, payload):
     """
     validate_payload(payload)
     return requests.get("http://localhost:%s/app/example_app/insert" % port, params={"payload": dumps(payload)})
+
+def add_index(port, app_name, table_name, columns):
+    """
+    This helper function submits a GET request to index one or more columns of
+    a table created by an existing application. See 
+    `tiresias.client.storage.add_index` for the backend implementation.
+    """
+    if type(columns) == str:
+        columns = [columns]
+    return requests.get("http://localhost:%s/app/%s/index" % (port, app_name), params={"table": table_name, "columns": dumps(columns)})
@@ -0,0 +1,133 @@
+"""
+This module provides the `TaskRunner` which executes the tasks accepted by the
+user concurrently and submits their results to the server as they complete.
+"""
+import requests
+import threading
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+import tiresias.server.remote
+from tiresias.client.handler import handle_task
+
+class TaskRunner(object):
+
+    def __init__(self, server_url, storage_dir, max_workers=4, max_readers=2, timeout=600.0):
+        """
+        The TaskRunner executes up to `max_workers` tasks at a time on a thread pool, where at most
+        `max_readers` of them can be querying the SQLite databases at once. The result of each task
+        is submitted to the server as soon as it completes unless the task has been cancelled or
+        has been running for more than `timeout` seconds. The results are submitted in batches (see
+        `flush`) so the results which complete while a request is in flight share the next one,
+        except for the binary results which are submitted individually;
+        results which can't be submitted because the server is offline are kept until the next
+        call to `flush`.
+
+        Note that threads can't be interrupted so a task which times out or is cancelled keeps its
+        worker busy until the handler returns; its result is simply discarded.
+        """
+        self.server_url = server_url
+        self.storage_dir = storage_dir
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._readers = threading.BoundedSemaphore(max_readers)
+        self._lock = threading.Lock()
+        self._running = {}
+        self._outbox = {}
+        self._flushing = False
+
+    def submit(self, task):
+        """
+        Queue the task for execution.
+        """
+        future = self._executor.submit(handle_task, self.storage_dir, task, self._readers)
+        with self._lock:
+            self._running[task["id"]] = (future, time() + self.timeout)
+        # The callback is called immediately if the future is already done so it must be added
+        # without holding the lock.
+        future.add_done_callback(lambda future: self._done(task["id"], future))
+        return future
+
+    def cancel(self, task_id):
+        """
+        Cancel the task (i.e. because the server is no longer accepting data for it); its result
+        won't be submitted.
+        """
+        with self._lock:
+            future, _ = self._running.pop(task_id, (None, None))
+        if future:
+            future.cancel()
+
+    def running(self):
+        """
+        Return the ids of the tasks which are queued or running.
+        """
+        with self._lock:
+            return list(self._running)
+
+    def flush(self):
+        """
+        Submit the completed results in a single request until there are none left. If another
+        thread is already submitting them, it picks up the new results instead.
+        """
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+        while True:
+            with self._lock:
+                results, self._outbox = self._outbox, {}
+                if not results:
+                    self._flushing = False
+                    return
+            try:
+                # The binary results (i.e. gradients, see `tiresias.core.codec`) can't be part of
+                # the JSON batch so they're submitted on their own; each one is dropped once sent.
+                for task_id, result in list(results.items()):
+                    if isinstance(result, (bytes, bytearray)):
+                        tiresias.server.remote.approve_task(self.server_url, task_id, result)
+                        del results[task_id]
+                if results:
+                    tiresias.server.remote.approve_tasks(self.server_url, results)
+            except requests.exceptions.ConnectionError:
+                # The results are only kept if they didn't reach the server; retrying a request
+                # which timed out could record them twice.
+                with self._lock:
+                    results.update(self._outbox)
+                    self._outbox = results
+                    self._flushing = False
+                raise
+            except Exception as err:
+                print("Failed to submit the results for %s: %s" % (", ".join(results), err))
+
+    def shutdown(self, wait=True):
+        """
+        Cancel the queued tasks and shut down the thread pool.
+        """
+        with self._lock:
+            futures = [future for future, _ in self._running.values()]
+        for future in futures:
+            future.cancel()
+        self._executor.shutdown(wait=wait)
+
+    def _done(self, task_id, future):
+        with self._lock:
+            entry = self._running.get(task_id)
+            if entry is None or entry[0] is not future:
+                return
+            del self._running[task_id]
+        if future.cancelled():
+            return
+        if time() > entry[1]:
+            print("Task %s timed out after %ss." % (task_id, self.timeout))
+            return
+
+        result, err = future.result()
+        if err:
+            print(err)
+            return
+        with self._lock:
+            self._outbox[task_id] = result
+        try:
+            self.flush()
+        except requests.exceptions.ConnectionError:
+            pass
@@ -0,0 +1,149 @@
+"""
+This module simulates many devices in a single process so that the platform
+can be load tested with thousands of data contributors on one machine. Each
+device has its own storage directory populated by `create_synthetic_dataset`
+and runs the `tiresias.client.aio.Device` logic, so it exercises the real
+server API; the devices share the event loop, the HTTP connection pool and a
+thread pool for executing tasks.
+
+```
+python -m tiresias.client.simulation --server_url http://localhost:3000/ --nb_devices 1000
+```
+"""
+import os
+import shutil
+import asyncio
+import argparse
+import tempfile
+from random import random
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+from tiresias.client.aio import Device, aiohttp
+from tiresias.client.storage import initialize
+from tiresias.client.synthetic import create_synthetic_datasets
+
+class Simulation(object):
+
+    def __init__(self, server_url, nb_devices, storage_dir=None, in_memory=False, max_workers=8,
+            max_connections=100, poll_interval=1.0, shared_poll=True):
+        """
+        The Simulation hosts `nb_devices` devices whose storage directories are created inside
+        `storage_dir` (a temporary directory by default). If `in_memory` is set, the temporary
+        directory is created on a RAM-backed filesystem (`/dev/shm`) when one is available and the
+        databases don't use a journal.
+
+        The tasks are executed on a pool of `max_workers` threads and at most `max_connections`
+        HTTP requests are in flight at once. If `shared_poll` is set, the task list is fetched once
+        every `poll_interval` seconds and dispatched to every device; otherwise, each device polls
+        the server on its own.
+        """
+        if aiohttp is None:
+            raise ImportError("The simulation requires aiohttp (pip install aiohttp).")
+        if not server_url.endswith("/"):
+            server_url += "/"
+        self.server_url = server_url
+        self.nb_devices = nb_devices
+        self.in_memory = in_memory
+        self.max_connections = max_connections
+        self.poll_interval = poll_interval
+        self.shared_poll = shared_poll
+
+        self._temporary = storage_dir is None
+        if self._temporary:
+            shm = "/dev/shm" if in_memory and os.path.isdir("/dev/shm") else None
+            storage_dir = tempfile.mkdtemp(prefix="tiresias-", dir=shm)
+        self.storage_dir = storage_dir
+        self._executor = ThreadPoolExecutor(max_workers)
+        self.devices = [Device(server_url, os.path.join(storage_dir, "device%s" % i), accept_all=True,
+            executor=self._executor, keep_connections=False) for i in range(nb_devices)]
+
+    def setup(self, seed=None, batch_size=256):
+        """
+        Create the storage directory and the synthetic dataset for each device. The datasets are
+        generated for batches of `batch_size` devices at once.
+        """
+        def _setup(i):
+            devices = self.devices[i:i + batch_size]
+            for device in devices:
+                if self.in_memory:
+                    initialize(device.storage_dir, journal_mode="MEMORY", synchronous="OFF")
+                else:
+                    initialize(device.storage_dir)
+            create_synthetic_datasets([device.storage_dir for device in devices], None if seed is None else seed + i)
+        list(self._executor.map(_setup, range(0, len(self.devices), batch_size)))
+
+    async def run_async(self, duration=None):
+        """
+        Run the devices for `duration` seconds (or until cancelled) and return the number of
+        payloads which were accepted by the server.
+        """
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            if self.shared_poll:
+                loops = [self._poll(session)]
+            else:
+                loops = [self._run_device(device, session) for device in self.devices]
+            try:
+                await asyncio.wait_for(asyncio.gather(*loops), duration)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                running = [task for device in self.devices for task in device._running.values()]
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+        return sum(device.nb_submitted for device in self.devices)
+
+    def run(self, duration=None):
+        return asyncio.run(self.run_async(duration))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for device in self.devices:
+            device.close()
+        if self._temporary:
+            shutil.rmtree(self.storage_dir, ignore_errors=True)
+
+    async def _poll(self, session):
+        while True:
+            start = time()
+            try:
+                async with session.get(self.server_url + "list") as response:
+                    tasks = await response.json(content_type=None)
+                for device in self.devices:
+                    device.dispatch(session, tasks)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                print("The server at %s is offline; retrying in 1s." % self.server_url)
+            await asyncio.sleep(max(self.poll_interval - (time() - start), 0.0))
+
+    async def _run_device(self, device, session):
+        # Spread out the requests from the devices.
+        await asyncio.sleep(random() * self.poll_interval)
+        await device.run(session)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server_url', type=str, default="http://localhost:3000/", help="The server.")
+    parser.add_argument('--nb_devices', type=int, default=100, help="The number of simulated devices.")
+    parser.add_argument('--storage_dir', type=str, default=None, help="The directory containing the device data.")
+    parser.add_argument('--in_memory', action='store_true', help="Keep the device data in memory if possible.")
+    parser.add_argument('--max_workers', type=int, default=8, help="The number of threads executing tasks.")
+    parser.add_argument('--max_connections', type=int, default=100, help="The maximum number of concurrent requests.")
+    parser.add_argument('--duration', type=float, default=None, help="How long to run the simulation for.")
+    parser.add_argument('--independent_polls', action='store_true', help="Make each device poll the server on its own.")
+    args = parser.parse_args()
+
+    simulation = Simulation(args.server_url, args.nb_devices, storage_dir=args.storage_dir, in_memory=args.in_memory,
+        max_workers=args.max_workers, max_connections=args.max_connections, shared_poll=not args.independent_polls)
+    try:
+        start = time()
+        simulation.setup()
+        print("Created %s devices in %.1fs." % (args.nb_devices, time() - start))
+        print("Submitted %s payloads." % simulation.run(args.duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulation.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,28 @@ This module provides functions for storing and retrieving data from a the
 underlying SQLite databases.
 """
 import os
+import re
+import sys
+import json
 import sqlite3
+import hashlib
+import threading
+import numpy as np
 from random import random
+from operator import itemgetter
+from collections import OrderedDict
+
+# The default maximum number of databases which can be attached to a SQLite connection.
+MAX_ATTACHED = 10
+
+# The SQLite types used for each of the column types supported in the schema.
+COLUMN_TYPES = {"int": "INTEGER", "float": "REAL", "string": "TEXT"}
+
+# The maximum size of the query results cached for each storage directory.
+CACHE_SIZE = 64 * 2**20
+
+# The pragmas applied to the databases in the storage directory; see `initialize`.
+DEFAULT_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL", "page_size": 4096}
 
 def dict_factory(cursor, row):
     """
@@ -16,16 +36,297 @@ def dict_factory(cursor, row):
         d[col[0]] = row[idx]
     return d
 
-def initialize(storage_dir):
+def normalize_sql(sql):
+    """
+    Collapse the whitespace outside of the string literals and strip the trailing semicolon so
+    that equivalent queries share the same cache entry.
+    """
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", sql)
+    parts[::2] = [re.sub(r"\s+", " ", part) for part in parts[::2]]
+    return "".join(parts).strip().rstrip(";").strip()
+
+def is_cacheable(sql):
+    """
+    Check whether the results of the query can be cached, i.e. it is a SELECT statement which
+    doesn't use any non-deterministic functions.
+    """
+    if not re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+        return False
+    return not re.search(r"\b(random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|'now'|\bcurrent_(time|date|timestamp)\b", sql, re.IGNORECASE)
+
+def has_unqualified_tables(sql):
+    """
+    Check whether any of the tables in the FROM and JOIN clauses of the query is referenced
+    without the name of its app, e.g. a table in the metadata database or a CTE. The check errs
+    on the side of returning True for the constructs it doesn't understand.
+    """
+    for clause in re.findall(r"\bFROM\b(.*?)(?=\b(?:WHERE|GROUP|HAVING|ORDER|LIMIT|WINDOW|UNION|EXCEPT|INTERSECT)\b|\)|$)", sql, re.IGNORECASE | re.DOTALL):
+        for table in re.split(r",|\bJOIN\b", clause, flags=re.IGNORECASE):
+            table = table.strip()
+            if table and not table.startswith("(") and not re.match(r"(\w+|\"[^\"]+\")\s*\.", table):
+                return True
+    return False
+
+class ResultCache(object):
+
+    def __init__(self, max_bytes):
+        """
+        The ResultCache is a thread-safe LRU cache which evicts the least recently used entries
+        once the total (approximate) size of the cached values exceeds `max_bytes`.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self.nbytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def discard(self, predicate):
+        """
+        Remove the entries whose key satisfies the predicate.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.nbytes -= self._entries.pop(key)[1]
+
+def _sizeof(rows):
+    # Estimate the size of the rows from a sample since they usually have similar sizes.
+    sample = rows[:100]
+    size = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+    return sys.getsizeof(rows) + size * len(rows) // max(len(sample), 1)
+
+class ConnectionManager(object):
+
+    def __init__(self, storage_dir, cache_size=CACHE_SIZE):
+        """
+        The ConnectionManager keeps a long-lived connection to the metadata database for each
+        thread, with the app databases already attached. If there are more apps than SQLite allows
+        attached databases, the apps referenced by each query are attached on demand and the least
+        recently used ones are detached.
+
+        The results of SELECT queries are cached in a `ResultCache` of up to `cache_size` bytes,
+        keyed by the normalized query and the data version of the apps which it references (or the
+        version of all the apps if it references any table without its app name). The data version
+        of an app is bumped by `insert_payload` and `insert_rows`, so the cache is only correct if
+        the app databases aren't written to by other processes.
+        """
+        self.storage_dir = storage_dir
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+        self._version = 0
+        self._versions = {}
+        self._cache = ResultCache(cache_size)
+
+    def invalidate(self):
+        """
+        Reload the list of apps (i.e. after an app is registered) on the next query and drop the
+        cached results.
+        """
+        with self._lock:
+            self._generation += 1
+            self._version += 1
+        self._cache.clear()
+
+    def release(self):
+        """
+        Close the connection opened by the calling thread, i.e. when many storage directories are
+        accessed from a thread pool (see `tiresias.client.simulation`).
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def bump(self, app_name):
+        """
+        Signal that the data stored by the app has changed.
+        """
+        with self._lock:
+            self._version += 1
+            self._versions[app_name] = self._versions.get(app_name, 0) + 1
+        self._cache.discard(lambda key: app_name in key[1] or not key[1])
+
+    def execute(self, sql, cache=True):
+        """
+        Execute the query and return a tuple containing the column names and the list of rows,
+        where each row is a tuple of values.
+        """
+        local = self._connect()
+        key = None
+        if cache and is_cacheable(sql):
+            app_names = ()
+            if not has_unqualified_tables(sql):
+                app_names = tuple(sorted(self._referenced_apps(local, sql)))
+            with self._lock:
+                versions = tuple(self._versions.get(app_name, 0) for app_name in app_names) if app_names else self._version
+            key = (normalize_sql(sql), app_names, versions)
+            result = self._cache.get(key)
+            if result is not None:
+                return result
+
+        try:
+            result = self._execute(local, sql)
+        except sqlite3.OperationalError:
+            # The app may have been registered by another process; reload the apps and retry.
+            local.generation = None
+            result = self._execute(self._connect(), sql)
+        if key is not None:
+            self._cache.put(key, result, _sizeof(result[1]))
+        return result
+
+    def _execute(self, local, sql):
+        self._attach(local, sql)
+        cursor = local.connection.cursor()
+        try:
+            cursor.execute(sql)
+            rows = cursor.fetchall()
+            columns = tuple(column[0] for column in cursor.description or [])
+            return columns, rows
+        finally:
+            cursor.close()
+
+    def _connect(self):
+        local = self._local
+        if getattr(local, "connection", None) is None:
+            local.connection = connect(self.storage_dir, "metadata")
+            local.attached = OrderedDict()
+            local.generation = None
+        if local.generation != self._generation:
+            local.generation = self._generation
+            cursor = local.connection.execute("SELECT app_name FROM apps")
+            local.apps = {app_name.lower(): app_name for app_name, in cursor}
+            if len(local.apps) <= MAX_ATTACHED:
+                for app_name in local.apps.values():
+                    self._attach_app(local, app_name)
+        return local
+
+    def _referenced_apps(self, local, sql):
+        app_names = OrderedDict()
+        for name in re.findall(r"(\w+)\s*\.", sql):
+            if name.lower() in local.apps:
+                app_names[local.apps[name.lower()]] = True
+        return list(app_names)
+
+    def _attach(self, local, sql):
+        if len(local.apps) <= MAX_ATTACHED:
+            return
+        app_names = self._referenced_apps(local, sql)
+        for app_name in app_names:
+            if app_name in local.attached:
+                local.attached.move_to_end(app_name)
+        for app_name in app_names:
+            if app_name not in local.attached:
+                if len(local.attached) >= MAX_ATTACHED:
+                    detached, _ = local.attached.popitem(last=False)
+                    local.connection.execute('DETACH DATABASE "%s"' % detached)
+                self._attach_app(local, app_name)
+
+    def _attach_app(self, local, app_name):
+        if app_name not in local.attached:
+            path = os.path.join(self.storage_dir, app_name + ".db")
+            local.connection.execute('ATTACH DATABASE ? AS "%s"' % app_name, (path,))
+            local.attached[app_name] = True
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def connection_manager(storage_dir):
+    """
+    Return the `ConnectionManager` shared by all the threads accessing the storage directory.
+    """
+    storage_dir = os.path.abspath(str(storage_dir))
+    with _managers_lock:
+        if storage_dir not in _managers:
+            _managers[storage_dir] = ConnectionManager(storage_dir)
+        return _managers[storage_dir]
+
+_pragmas = {}
+
+def release(storage_dir):
+    """
+    Drop the `ConnectionManager` for the storage directory along with its cached results and
+    pragmas (i.e. when a device is torn down). The connection opened by the calling thread is
+    closed; those of the other threads are closed once they are garbage collected.
+    """
+    storage_dir = os.path.abspath(str(storage_dir))
+    with _managers_lock:
+        manager = _managers.pop(storage_dir, None)
+        _pragmas.pop(storage_dir, None)
+    if manager is not None:
+        manager.release()
+        manager._cache.clear()
+
+def validate_pragmas(pragmas):
+    assert set(pragmas) <= set(DEFAULT_PRAGMAS), "Expected pragmas to be in %s" % set(DEFAULT_PRAGMAS)
+    assert pragmas.get("journal_mode", "WAL").upper() in ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"], "Invalid journal_mode"
+    assert pragmas.get("synchronous", "NORMAL").upper() in ["OFF", "NORMAL", "FULL", "EXTRA"], "Invalid synchronous"
+    page_size = pragmas.get("page_size", 4096)
+    assert type(page_size) == int and 512 <= page_size <= 65536 and page_size & (page_size - 1) == 0, "Expected page_size to be a power of two between 512 and 65536"
+
+def connect(storage_dir, database):
+    """
+    Open a connection to the given database (i.e. "metadata" or the name of an app) and apply the
+    pragmas which were passed to `initialize`.
+    """
+    key = os.path.abspath(str(storage_dir))
+    if key not in _pragmas:
+        connection = sqlite3.connect(os.path.join(storage_dir, "metadata.db"))
+        try:
+            _pragmas[key] = dict(DEFAULT_PRAGMAS, **dict(connection.execute("SELECT key, value FROM settings")))
+        except sqlite3.OperationalError:
+            _pragmas[key] = dict(DEFAULT_PRAGMAS)
+        finally:
+            connection.close()
+
+    # The page size only applies to new databases so it must be set before anything else.
+    connection = sqlite3.connect(os.path.join(storage_dir, "%s.db" % database))
+    connection.execute("PRAGMA page_size = %d" % int(_pragmas[key]["page_size"]))
+    connection.execute("PRAGMA journal_mode = %s" % _pragmas[key]["journal_mode"])
+    connection.execute("PRAGMA synchronous = %s" % _pragmas[key]["synchronous"])
+    return connection
+
+def initialize(storage_dir, journal_mode="WAL", synchronous="NORMAL", page_size=4096):
     """
     This function creates the data directory if necessary and initializes the 
-    metadata database.
+    metadata database. The `journal_mode`, `synchronous` and `page_size` pragmas
+    are applied to every database in the data directory; the page size only
+    affects databases which are created afterwards.
     """
+    pragmas = {"journal_mode": journal_mode, "synchronous": synchronous, "page_size": page_size}
+    validate_pragmas(pragmas)
     if not os.path.exists(storage_dir):
         os.makedirs(storage_dir)
-    connection = sqlite3.connect(os.path.join(storage_dir, "metadata.db"))
+    _pragmas[os.path.abspath(str(storage_dir))] = pragmas
+    connection = connect(storage_dir, "metadata")
     cursor = connection.cursor()
     cursor.executescript("""
+        CREATE TABLE IF NOT EXISTS settings (key PRIMARY KEY, value);
         CREATE TABLE IF NOT EXISTS apps (app_name);
         CREATE TABLE IF NOT EXISTS app_tables (
             app_name, 
@@ -40,8 +341,11 @@ def initialize(storage_dir):
             column_description
         );
     """)
+    cursor.executemany("INSERT OR REPLACE INTO settings VALUES (?, ?)", pragmas.items())
+    connection.commit()
     cursor.close()
     connection.close()
+    connection_manager(storage_dir).invalidate()
 
 def app_columns(storage_dir):
     """
@@ -60,26 +364,37 @@ def app_columns(storage_dir):
 
     return rows
 
-def execute_sql(storage_dir, sql):
+def execute_sql(storage_dir, sql, cache=True, columnar=False):
     """
     Execute the given query on the database, using "<app_name>.<table_name>" to specify tables.
-    """
-    connection = sqlite3.connect(os.path.join(storage_dir, "metadata.db"))
-    connection.row_factory = dict_factory
-    cursor = connection.cursor()
-
-    try:
-        cursor.execute("SELECT * FROM apps")
-        for app in cursor.fetchall():
-            cursor.execute("ATTACH DATABASE '%s' AS %s" % (os.path.join(storage_dir, app["app_name"] + ".db"), app["app_name"]))
+    The connections are kept open between calls and, unless `cache` is False, the results are
+    cached until the data is modified; see `ConnectionManager`.
 
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-    finally:
-        cursor.close()
-        connection.close()
+    The rows are returned as a list of dictionaries unless `columnar` is set, in which case a
+    dictionary mapping each column to a NumPy array of values is returned (see `to_columns`).
+    """
+    columns, rows = connection_manager(storage_dir).execute(sql, cache=cache)
+    if columnar:
+        return to_columns(columns, rows)
+    return [dict(zip(columns, row)) for row in rows]
 
-    return rows
+def to_columns(columns, rows):
+    """
+    Convert a list of rows (tuples) into a dictionary which maps each column to a NumPy array. The
+    dtype is inferred from the values (i.e. int64, float64 or a string type); columns which mix
+    types or contain NULLs are object arrays.
+    """
+    data = {}
+    for i, column in enumerate(columns):
+        column_values = list(map(itemgetter(i), rows))
+        types = set(map(type, column_values))
+        if types <= {int, float} and types:
+            data[column] = np.array(column_values)
+        elif types == {str}:
+            data[column] = np.array(column_values, dtype=str)
+        else:
+            data[column] = np.array(column_values, dtype=object)
+    return data
 
 def validate_schema(schema):
     assert type(schema) == dict, "Expected schema to be a dictionary."
@@ -94,6 +409,11 @@ def validate_schema(schema):
             assert "description" in column, "Expected column to contain a description"
             assert column["type"] in ["int", "string", "float"], "Expected type to be in {int, string, float}"
             assert type(column["description"]) == str, "Expected description to be a string"
+            assert type(column.get("index", False)) == bool, "Expected index to be a boolean"
+        for columns in table.get("indexes", []):
+            assert type(columns) == list and columns, "Expected each index to be a list of columns"
+            for column_name in columns:
+                assert column_name in table["columns"], "Expected index to contain existing columns"
 
 def register_app(storage_dir, app_name, schema):
     """
@@ -121,18 +441,24 @@ def register_app(storage_dir, app_name, schema):
                 },
                 "column2": {
                     "type": "string",
-                    "description: "This column contains 2."
+                    "description: "This column contains 2.",
+                    "index": True
                 }
-            }
+            },
+            "indexes": [["column2", "column1"]]
         }
     }
     ```
+
+    The columns are created with the SQLite type corresponding to their type (see `COLUMN_TYPES`).
+    An index is created for each column where `index` is set and for each list of columns in the
+    optional `indexes` field of the table.
     """
     # Validate the schema
     validate_schema(schema)
 
     # Update the metadata database
-    connection = sqlite3.connect(os.path.join(storage_dir, "metadata.db"))
+    connection = connect(storage_dir, "metadata")
     cursor = connection.cursor()
     try:
         cursor.execute("SELECT * FROM apps WHERE app_name = ?", (app_name,))
@@ -150,16 +476,57 @@ def register_app(storage_dir, app_name, schema):
 
     # Create the app database
     try:
-        connection = sqlite3.connect(os.path.join(storage_dir, "%s.db" % app_name))
+        connection = connect(storage_dir, app_name)
         cursor = connection.cursor()
         for table_name, table in schema.items():
-            cursor.execute("CREATE TABLE %s (%s)" % (table_name, ",".join(table["columns"].keys())))
+            columns = ["%s %s" % (name, COLUMN_TYPES[column["type"]]) for name, column in table["columns"].items()]
+            cursor.execute("CREATE TABLE %s (%s)" % (table_name, ",".join(columns)))
+            for column_name, column in table["columns"].items():
+                if column.get("index", False):
+                    _create_index(cursor, table_name, [column_name])
+            for columns in table.get("indexes", []):
+                _create_index(cursor, table_name, columns)
         cursor.close()
         connection.commit()
     except:
         raise
     finally:
         connection.close()
+    connection_manager(storage_dir).invalidate()
+
+def add_index(storage_dir, app_name, table_name, columns):
+    """
+    Create an index on the given column (or list of columns, for a composite index) of a table
+    which belongs to a registered app. Featurizers which filter, join or group by the columns can
+    then use the index instead of scanning the table.
+    """
+    if type(columns) == str:
+        columns = [columns]
+    assert type(columns) == list and columns, "Expected index to be a list of columns"
+
+    connection = sqlite3.connect(os.path.join(storage_dir, "metadata.db"))
+    try:
+        cursor = connection.execute("SELECT column_name FROM app_columns WHERE app_name = ? AND table_name = ?", (app_name, table_name))
+        existing = set(column_name for column_name, in cursor)
+    finally:
+        connection.close()
+    assert existing, "Table not found."
+    for column_name in columns:
+        assert column_name in existing, "Column not found: %s" % column_name
+
+    connection = connect(storage_dir, app_name)
+    try:
+        with connection:
+            _create_index(connection, table_name, columns)
+    finally:
+        connection.close()
+
+def _create_index(cursor, table_name, columns):
+    # Joining the names with underscores is ambiguous (e.g. ["a_b"] and ["a", "b"]) and the
+    # second index would be silently skipped, so the name includes a hash of the columns.
+    digest = hashlib.sha1(json.dumps([table_name] + list(columns)).encode()).hexdigest()[:16]
+    index_name = "%s_%s" % (table_name, digest)
+    cursor.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (index_name, table_name, ", ".join(columns)))
 
 def validate_payload(payload):
     assert type(payload) == dict, "Expected payload to be a dictionary."
@@ -185,23 +552,48 @@ def insert_payload(storage_dir, app_name, payload):
         }]
     }
     ```
+
+    Consecutive rows which contain the same columns are inserted with a single `executemany`.
     """
     assert os.path.exists(os.path.join(storage_dir, "%s.db" % app_name)), "App not found."
-    connection = sqlite3.connect(os.path.join(storage_dir, "%s.db" % app_name))
-    cursor = connection.cursor()
+    connection = connect(storage_dir, app_name)
+    try:
+        with connection:
+            for table_name, rows in payload.items():
+                _insert_rows(connection, table_name, rows)
+    finally:
+        connection.close()
+        connection_manager(storage_dir).bump(app_name)
 
+def insert_rows(storage_dir, app_name, table_name, rows, batch_size=1000):
+    """
+    Insert the rows into the table in a single transaction, where `rows` is an iterable of
+    dictionaries (i.e. a generator). The rows are written in batches of up to `batch_size` rows
+    so that the whole iterable is never held in memory. Returns the number of rows inserted.
+    """
+    assert os.path.exists(os.path.join(storage_dir, "%s.db" % app_name)), "App not found."
+    connection = connect(storage_dir, app_name)
     try:
-        for table_name, rows in payload.items():
-            for row in rows:
-                keys, values = [], []
-                for k, v in row.items():
-                    keys.append(k)
-                    values.append(v)
-                
-                columns = ', '.join(keys)
-                placeholders = ', '.join('?' * len(keys))
-                sql = 'INSERT INTO {} ({}) VALUES ({})'.format(table_name, columns, placeholders)
-                cursor.execute(sql, values)
-        connection.commit()
+        with connection:
+            return _insert_rows(connection, table_name, rows, batch_size)
     finally:
         connection.close()
+        connection_manager(storage_dir).bump(app_name)
+
+def _insert_rows(connection, table_name, rows, batch_size=None):
+    # The rows are passed to `executemany` as is using named placeholders; a new batch is started
+    # whenever the columns change or the batch is full.
+    rows, count = iter(rows), 0
+    row = next(rows, None)
+    while row is not None:
+        assert type(row) == dict, "Expected each row in the update to be a dictionary"
+        columns, batch, row = row.keys(), [row], None
+        for next_row in rows:
+            if type(next_row) != dict or next_row.keys() != columns or len(batch) == batch_size:
+                row = next_row
+                break
+            batch.append(next_row)
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(table_name, ', '.join(columns), ', '.join(':' + k for k in columns))
+        connection.executemany(sql, batch)
+        count += len(batch)
+    return count
@@ -1,103 +1,67 @@
+"""
+This module generates synthetic profiles, browsing histories and screen time
+events for simulated devices. The samples for a whole batch of devices are
+drawn at once with NumPy from a (optionally seeded) random generator and are
+written with the bulk insert path of `tiresias.client.storage`. The cities are
+drawn from `cities.csv`, which lists a zipcode in each of the largest US cities.
+"""
 import os
-import barnum
+import numpy as np
 import pandas as pd
-from time import time
-from random import randint, random, choice
+from functools import lru_cache
 from tiresias.client.storage import register_app, insert_payload
 
-def sample_profile():
-    payload = {}
-    zipcode, city, state = barnum.create_city_state_zip()
-    payload["demographics"] = [{
-        "age": randint(18, 100),
-        "gender": choice(["Male", "Female", "Other"]),
-        "income": randint(10, 1000) * 1000,
-        "city": city,
-        "state": state,
-        "zipcode": zipcode
-    }]
-    return payload
-
-def sample_browsing(profile):
-    age = profile["demographics"][0]["age"] / 100.0
-    payload = {}
-    payload["history"] = []
-    df = pd.read_csv(os.path.join(os.path.dirname(__file__), "domains.csv"))
-    for _ in range(100 - randint(0, int(99 * age))):
-        payload["history"].append({
-            "timestamp": time() + randint(0, 10000),
-            "domain": choice(df["Root Domain"].values)
-        })
-    return payload
-
-def sample_screen_time(profile):
-    payload = {}
-    payload["types"] = [
-        {"application_name": "Chrome", "application_type": "browser"},
-        {"application_name": "Safari", "application_type": "browser"},
-        {"application_name": "Firefox", "application_type": "browser"},
-        {"application_name": "Microsoft Edge", "application_type": "browser"},
-        {"application_name": "Internet Explorer", "application_type": "browser"},
-        {"application_name": "VSCode", "application_type": "development"},
-        {"application_name": "Terminal", "application_type": "development"},
-        {"application_name": "iTerm", "application_type": "development"},
-        {"application_name": "Slack", "application_type": "communication"},
-        {"application_name": "Skype", "application_type": "communication"},
-        {"application_name": "Zoom", "application_type": "communication"},
-    ]
-    payload["events"] = []
-    df = pd.read_csv(os.path.join(os.path.dirname(__file__), "domains.csv"))
-    for _ in range(randint(1, 100)):
-        timestamp = time() + randint(0, 10000)
-        application_name = choice(payload["types"])["application_name"]
-        payload["events"].append({
-            "timestamp": timestamp,
-            "event_type": "open",
-            "application_name": application_name
-        })
-        payload["events"].append({
-            "timestamp": timestamp + randint(0, 10000),
-            "event_type": "close",
-            "application_name": application_name
-        })
-    return payload
-
-def create_synthetic_dataset(storage_dir):
-    register_app(storage_dir, "profile", {
+GENDERS = np.array(["Male", "Female", "Other"])
+
+# The timestamps are offsets from a fixed epoch (2020-01-01 UTC) so the samples only depend on the seed.
+EPOCH = 1577836800.0
+
+APPLICATION_TYPES = [
+    {"application_name": "Chrome", "application_type": "browser"},
+    {"application_name": "Safari", "application_type": "browser"},
+    {"application_name": "Firefox", "application_type": "browser"},
+    {"application_name": "Microsoft Edge", "application_type": "browser"},
+    {"application_name": "Internet Explorer", "application_type": "browser"},
+    {"application_name": "VSCode", "application_type": "development"},
+    {"application_name": "Terminal", "application_type": "development"},
+    {"application_name": "iTerm", "application_type": "development"},
+    {"application_name": "Slack", "application_type": "communication"},
+    {"application_name": "Skype", "application_type": "communication"},
+    {"application_name": "Zoom", "application_type": "communication"},
+]
+
+SCHEMAS = {
+    "profile": {
         "demographics": {
             "description": "",
             "columns": {
                 "age": {"type": "float", "description": ""},
-                "gender": {"type": "float", "description": ""},
+                "gender": {"type": "string", "description": ""},
                 "income": {"type": "float", "description": ""},
-                "city": {"type": "float", "description": ""},
-                "state": {"type": "float", "description": ""},
-                "zipcode": {"type": "float", "description": ""},
+                "city": {"type": "string", "description": ""},
+                "state": {"type": "string", "description": ""},
+                "zipcode": {"type": "string", "description": ""},
             }
         }
-    })
-    profile = sample_profile()
-    insert_payload(storage_dir, "profile", profile)
-
-    register_app(storage_dir, "browsing", {
+    },
+    "browsing": {
         "history": {
             "description": "",
             "columns": {
-                "timestamp": {"type": "float", "description": "When the website was opened"},
-                "domain": {"type": "float", "description": "The domain (i.e. everything up to `.com`, `.net`, etc.)"},
+                "timestamp": {"type": "float", "description": "When the website was opened", "index": True},
+                "domain": {"type": "string", "description": "The domain (i.e. everything up to `.com`, `.net`, etc.)", "index": True},
             }
         },
-    })
-    insert_payload(storage_dir, "browsing", sample_browsing(profile))
-
-    register_app(storage_dir, "screen_time", {
+    },
+    "screen_time": {
         "events": {
             "description": "",
             "columns": {
-                "timestamp": {"type": "float", "description": "When the event occurred."},
+                "timestamp": {"type": "float", "description": "When the event occurred.", "index": True},
                 "event_type": {"type": "string", "description": "Whether the application was opened or closed."},
                 "application_name": {"type": "string", "description": "Standardized name for the application."},
-            }
+            },
+            "indexes": [["application_name", "timestamp"]]
         },
         "types": {
             "description": "",
@@ -106,5 +70,109 @@ def create_synthetic_dataset(storage_dir):
                 "application_type": {"type": "string", "description": "Whether the application is for web browsing, software development, or communicaation."},
             }
         },
-    })
-    insert_payload(storage_dir, "screen_time", sample_screen_time(profile))
+    },
+}
+
+@lru_cache(maxsize=None)
+def _domains():
+    df = pd.read_csv(os.path.join(os.path.dirname(__file__), "domains.csv"))
+    return df["Root Domain"].values.astype(str)
+
+@lru_cache(maxsize=None)
+def _zipcodes():
+    df = pd.read_csv(os.path.join(os.path.dirname(__file__), "cities.csv"), dtype=str)
+    return df["Zipcode"].values, df["City"].values, df["State"].values
+
+def _rows(**columns):
+    # Convert the columns (NumPy arrays) into a list of rows containing Python objects.
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*[columns[key].tolist() for key in keys])]
+
+def _split(rows, counts):
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return [rows[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+def sample_profiles(nb_devices, rng=None):
+    """
+    Sample the demographics of each device; returns one payload for the profile app per device.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    zipcodes, cities, states = _zipcodes()
+    i = rng.integers(0, len(zipcodes), nb_devices)
+    rows = _rows(
+        age=rng.integers(18, 101, nb_devices),
+        gender=GENDERS[rng.integers(0, len(GENDERS), nb_devices)],
+        income=rng.integers(10, 1001, nb_devices) * 1000,
+        city=cities[i],
+        state=states[i],
+        zipcode=zipcodes[i],
+    )
+    return [{"demographics": [row]} for row in rows]
+
+def sample_histories(profiles, rng=None):
+    """
+    Sample the browsing history of each device, where older users visit fewer websites; returns
+    one payload for the browsing app per profile.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    ages = np.array([profile["demographics"][0]["age"] for profile in profiles]) / 100.0
+    counts = 100 - rng.integers(0, (99 * ages).astype(int) + 1)
+    domains = _domains()
+    rows = _rows(
+        timestamp=EPOCH + rng.integers(0, 10001, counts.sum()).astype(float),
+        domain=domains[rng.integers(0, len(domains), counts.sum())],
+    )
+    return [{"history": history} for history in _split(rows, counts)]
+
+def sample_screen_times(profiles, rng=None):
+    """
+    Sample the applications opened and closed on each device; returns one payload for the
+    screen_time app per profile.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    counts = rng.integers(1, 101, len(profiles))
+    names = np.array([row["application_name"] for row in APPLICATION_TYPES])
+
+    # Each application is opened and later closed, so the events come in pairs.
+    opened = EPOCH + rng.integers(0, 10001, counts.sum()).astype(float)
+    closed = opened + rng.integers(0, 10001, counts.sum())
+    rows = _rows(
+        timestamp=np.stack([opened, closed], axis=1).ravel(),
+        event_type=np.tile(["open", "close"], counts.sum()),
+        application_name=np.repeat(names[rng.integers(0, len(names), counts.sum())], 2),
+    )
+    return [{"types": list(APPLICATION_TYPES), "events": events} for events in _split(rows, 2 * counts)]
+
+def sample_profile(rng=None):
+    return sample_profiles(1, rng)[0]
+
+def sample_browsing(profile, rng=None):
+    return sample_histories([profile], rng)[0]
+
+def sample_screen_time(profile, rng=None):
+    return sample_screen_times([profile], rng)[0]
+
+def create_synthetic_datasets(storage_dirs, seed=None):
+    """
+    Register the synthetic apps in each of the (initialized) storage directories and populate
+    them with samples which are generated for all the directories at once. Returns the number of
+    rows which were inserted.
+    """
+    rng = np.random.default_rng(seed)
+    profiles = sample_profiles(len(storage_dirs), rng)
+    payloads = {
+        "profile": profiles,
+        "browsing": sample_histories(profiles, rng),
+        "screen_time": sample_screen_times(profiles, rng),
+    }
+
+    nb_rows = 0
+    for i, storage_dir in enumerate(storage_dirs):
+        for app_name, schema in SCHEMAS.items():
+            register_app(storage_dir, app_name, schema)
+            insert_payload(storage_dir, app_name, payloads[app_name][i])
+            nb_rows += sum(len(rows) for rows in payloads[app_name][i].values())
+    return nb_rows
+
+def create_synthetic_dataset(storage_dir, seed=None):
+    return create_synthetic_datasets([storage_dir], seed)
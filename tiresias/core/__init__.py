@@ -1,4 +1,5 @@
 import pickle, codecs
+from tiresias.core import codec
 
 def b64_encode(obj):
     """
@@ -10,6 +11,26 @@ def b64_encode(obj):
 def b64_decode(obj):
     """
     Decode the given base64 string and attempt to unpickle it to recover the 
-    original Python object.
+    original Python object. Strings produced by `b64_encode_arrays` are decoded
+    with `tiresias.core.codec` instead.
     """
-    return pickle.loads(codecs.decode(obj.encode(), "base64"))
+    buffer = codecs.decode(obj.encode(), "base64")
+    if codec.is_encoded(buffer):
+        return codec.decode(buffer)
+    return pickle.loads(buffer)
+
+def b64_encode_arrays(arrays, compress=False):
+    """
+    Encode a list of NumPy arrays and/or PyTorch tensors using the binary format
+    in `tiresias.core.codec` as a base64 string. This is smaller and faster than
+    pickling the arrays.
+    """
+    return codecs.encode(codec.encode(arrays, compress=compress), "base64").decode()
+
+def b64_decode_arrays(obj):
+    """
+    Decode a string produced by `b64_encode_arrays`. Unlike `b64_decode`, this 
+    never unpickles the input so it is safe to use on untrusted payloads. The
+    base64 decoding produces a new buffer which the arrays are views into.
+    """
+    return codec.decode(bytearray(codecs.decode(obj.encode(), "base64")))
@@ -1,6 +1,10 @@
+import os
 import numpy as np
 import diffprivlib.models as dp
-from tiresias.core.mechanisms import approximate_bounds
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+from tiresias.core.mechanisms import approximate_bounds, approximate_column_bounds
+from tiresias.core.preprocessing import clip_norms, clip_columns
 
 class GaussianNB(dp.GaussianNB):
 
@@ -9,12 +13,9 @@ class GaussianNB(dp.GaussianNB):
 
     def fit(self, X, y, sample_weight=None):
         if not self.bounds:
-            self.bounds = []
             self.epsilon /= 2.0
-            for column in range(X.shape[1]):
-                bounds = approximate_bounds(X[:,column], self.epsilon / X.shape[1])
-                self.bounds.append(bounds)
-                X[:,column] = np.minimum(np.maximum(X[:,column], bounds[0]), bounds[1])
+            self.bounds = approximate_column_bounds(X, self.epsilon / X.shape[1])
+            X = clip_columns(X, self.bounds)
         return super().fit(X, y, sample_weight=sample_weight)
 
 class LogisticRegression(dp.LogisticRegression):
@@ -26,35 +27,91 @@ class LogisticRegression(dp.LogisticRegression):
             row_norms = np.linalg.norm(X, axis=1)
             _, max_norm = approximate_bounds(row_norms, 1.0)
             self.data_norm = max_norm
-            for i in range(X.shape[0]):
-                if np.linalg.norm(X[i]) > self.data_norm:
-                    X[i] = X[i] * (self.data_norm - 1e-5) / np.linalg.norm(X[i])
+            X = clip_norms(X, self.data_norm, row_norms)
         return super().fit(X, y, sample_weight=sample_weight)
 
+# The candidates evaluated by `TiresiasClassifier` unless the task specifies its own; each one
+# names a model in this module and the keyword arguments to pass to it.
+CANDIDATES = [
+    {"model": "GaussianNB"},
+    {"model": "LogisticRegression", "C": 0.01},
+    {"model": "LogisticRegression", "C": 0.1},
+    {"model": "LogisticRegression", "C": 1.0},
+    {"model": "LogisticRegression", "C": 10.0},
+    {"model": "LogisticRegression", "C": 100.0},
+]
+
+# The models which can be used as candidates along with the keyword arguments which a task is
+# allowed to set for each of them.
+MODELS = {
+    "GaussianNB": (GaussianNB, {"var_smoothing"}),
+    "LogisticRegression": (LogisticRegression, {"C", "max_iter", "tol"}),
+}
+
+# The maximum number of candidates, since each of them is fitted on the server.
+MAX_CANDIDATES = 16
+
+def validate_candidates(candidates):
+    assert type(candidates) == list and 0 < len(candidates) <= MAX_CANDIDATES, "Expected a list of 1 to %s candidates" % MAX_CANDIDATES
+    for candidate in candidates:
+        assert type(candidate) == dict and candidate.get("model") in MODELS, "Expected the model to be in %s" % set(MODELS)
+        kwargs = {k: v for k, v in candidate.items() if k != "model"}
+        assert set(kwargs) <= MODELS[candidate["model"]][1], "Expected the arguments to be in %s" % MODELS[candidate["model"]][1]
+        for value in kwargs.values():
+            assert type(value) in (int, float) and 0 < value < float("inf"), "Expected the arguments to be positive numbers"
+
+def _fit_candidate(candidate, epsilon, X_train, y_train, X_test, y_test):
+    from sklearn.metrics import f1_score
+    kwargs = {k: v for k, v in candidate.items() if k != "model"}
+    start = time()
+    model = MODELS[candidate["model"]][0](epsilon=epsilon, **kwargs)
+    model.fit(X_train, y_train)
+    score = float(f1_score(y_test, model.predict(X_test)))
+    return model, score, time() - start
+
 class TiresiasClassifier(dp.LogisticRegression):
 
-    def __init__(self, epsilon):
+    def __init__(self, epsilon, candidates=None, n_jobs=1, refit=True):
+        """
+        The TiresiasClassifier fits each of the `candidates` (see `CANDIDATES` and `MODELS`) on a
+        training split, picks one with the exponential mechanism based on its F1 score on the test
+        split and, if `refit` is set, fits the chosen model on all the data. The candidates are
+        fitted on up to `n_jobs` threads (-1 uses one thread per CPU); the number of threads never
+        exceeds the number of CPUs or candidates. After fitting, `timings_` contains the score and
+        the fitting time of each candidate.
+        """
+        assert type(n_jobs) == int and (n_jobs == -1 or n_jobs >= 1), "Expected n_jobs to be -1 or a positive integer"
         self.epsilon_model = epsilon * 0.5
         self.epsilon_selection = epsilon * 0.5
+        self.candidates = CANDIDATES if candidates is None else candidates
+        validate_candidates(self.candidates)
+        self.n_jobs = n_jobs
+        self.refit = refit
 
     def fit(self, X, y):
-        from sklearn.metrics import f1_score
         from sklearn.model_selection import train_test_split
         X_train, X_test, y_train, y_test = train_test_split(X, y)
 
-        models, scores = [], []
-        model = GaussianNB(epsilon=self.epsilon_model)
-        models.append(model.fit(X_train, y_train))
-        scores.append(f1_score(y_test, model.predict(X_test)))
-        for C in [0.01, 0.1, 1.0, 10.0, 100.0]:
-            model = LogisticRegression(epsilon=self.epsilon_model, C=C)
-            models.append(model.fit(X_train, y_train))
-            scores.append(f1_score(y_test, model.predict(X_test)))
+        cpu_count = os.cpu_count() or 1
+        n_jobs = min(cpu_count if self.n_jobs == -1 else self.n_jobs, cpu_count, len(self.candidates))
+        args = (self.epsilon_model, X_train, y_train, X_test, y_test)
+        if n_jobs > 1:
+            with ThreadPoolExecutor(n_jobs) as executor:
+                results = list(executor.map(lambda candidate: _fit_candidate(candidate, *args), self.candidates))
+        else:
+            results = [_fit_candidate(candidate, *args) for candidate in self.candidates]
+        models, scores, times = zip(*results)
+        self.timings_ = [dict(candidate, score=score, time=t) for candidate, score, t in zip(self.candidates, scores, times)]
+
         probabilities = np.exp(self.epsilon_selection * np.array(scores) / 2)
         probabilities = probabilities / np.sum(probabilities)
+        self.model = models[np.random.choice(len(models), p=probabilities)]
 
-        self.model = np.random.choice(models, p=probabilities, size=1)[0]
-        self.model.fit(X, y)
+        # The chosen model keeps the bounds it estimated on the training split, so the refit doesn't
+        # spend any more of the budget on estimating them.
+        if self.refit:
+            self.model.fit(X, y)
+        return self
     
     def predict(self, X):
         return self.model.predict(X)
@@ -0,0 +1,107 @@
+"""
+This module provides a compact binary format for transmitting lists of NumPy arrays and PyTorch
+tensors (i.e. gradients) without pickling them. The format consists of a small header followed by
+the raw little-endian buffers of each array:
+
+```
+magic (4 bytes) | flags (uint8) | count (uint32) | body
+```
+
+where the header is padded to 16 bytes and the body, which may be compressed with zlib, contains
+a descriptor for each array (kind, dtype, shape, offset) followed by the array buffers, each
+aligned to 8 bytes. Decoding uses
+`np.frombuffer` so, given a writable buffer such as a `bytearray`, the arrays are views into that
+buffer rather than copies.
+"""
+import zlib
+import struct
+import numpy as np
+
+MAGIC = b"TRS\x01"
+COMPRESSED = 1
+MAX_DECOMPRESSED_SIZE = 256 * 1024 * 1024
+
+_NUMPY, _TORCH = 0, 1
+_HEADER = struct.Struct("<4sB3xI4x")
+_DESCRIPTOR = struct.Struct("<BB8sQQ")
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def is_encoded(buffer):
+    """
+    Check whether the buffer was produced by `encode`.
+    """
+    return bytes(buffer[:len(MAGIC)]) == MAGIC
+
+def encode(arrays, compress=False):
+    """
+    Encode a list of NumPy arrays and/or PyTorch tensors into a bytes object. If `compress` is set,
+    the body is compressed with zlib, which is worthwhile for sparse or low-entropy arrays.
+    """
+    descriptors, buffers, offset = [], [], 0
+    for array in arrays:
+        kind = _NUMPY
+        if type(array).__module__.startswith("torch"):
+            kind, array = _TORCH, array.detach().cpu().numpy()
+        array = np.asarray(array)
+        if array.dtype.hasobject or array.ndim > 255 or len(array.dtype.str) > 8:
+            raise ValueError("Unable to encode array of type %s." % array.dtype)
+        array = np.asarray(array, dtype=array.dtype.newbyteorder("<"), order="C")
+        descriptors.append(_DESCRIPTOR.pack(kind, array.ndim, array.dtype.str.encode(), offset, array.nbytes))
+        descriptors.append(struct.pack("<%dQ" % array.ndim, *array.shape))
+        buffers.append((offset, array))
+        offset = _align(offset + array.nbytes)
+
+    # The descriptors are followed by the data section which contains the aligned buffers.
+    descriptors = b"".join(descriptors)
+    data_start = _align(len(descriptors))
+    body = bytearray(data_start + offset)
+    body[:len(descriptors)] = descriptors
+    for offset, array in buffers:
+        start = data_start + offset
+        body[start:start + array.nbytes] = array.reshape(-1).view(np.uint8).data
+
+    flags = 0
+    if compress:
+        flags |= COMPRESSED
+        body = zlib.compress(body)
+    return _HEADER.pack(MAGIC, flags, len(buffers)) + body
+
+def decode(buffer, max_size=MAX_DECOMPRESSED_SIZE):
+    """
+    Decode a buffer produced by `encode` and return the list of arrays and/or tensors. The arrays
+    are writable views into a single buffer; the input is only copied if it is compressed or
+    read-only (i.e. a bytes object). A compressed body which expands to more than `max_size` bytes
+    is rejected without decompressing the rest of it.
+    """
+    magic, flags, count = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Unknown encoding.")
+    body = memoryview(buffer)[_HEADER.size:]
+    if flags & COMPRESSED:
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(body, max_size + 1)
+        if len(data) > max_size or decompressor.unconsumed_tail:
+            raise ValueError("The decompressed body is larger than %s bytes." % max_size)
+        body = memoryview(bytearray(data))
+    elif body.readonly:
+        body = memoryview(bytearray(body))
+
+    descriptors, position = [], 0
+    for _ in range(count):
+        kind, ndim, dtype, offset, nbytes = _DESCRIPTOR.unpack_from(body, position)
+        position += _DESCRIPTOR.size
+        shape = struct.unpack_from("<%dQ" % ndim, body, position)
+        position += 8 * ndim
+        descriptors.append((kind, np.dtype(dtype.rstrip(b"\x00").decode()), shape, offset, nbytes))
+
+    arrays, data_start = [], _align(position)
+    for kind, dtype, shape, offset, nbytes in descriptors:
+        array = np.frombuffer(body, dtype=dtype, count=nbytes // dtype.itemsize, offset=data_start + offset)
+        array = array.reshape(shape)
+        if kind == _TORCH:
+            import torch
+            array = torch.from_numpy(array)
+        arrays.append(array)
+    return arrays
@@ -1,4 +1,6 @@
 import numpy as np
+from functools import lru_cache
+from tiresias.core.sensitivity import median_smooth_sensitivity
 
 def count(x, epsilon, delta):
     """
@@ -14,6 +16,30 @@ def laplace_noise(x, sensitivity, epsilon):
     """
     return np.random.laplace(loc=x, scale=sensitivity/epsilon)
 
+@lru_cache(maxsize=None)
+def _log_cutoffs(scale, base, bins):
+    """
+    This function returns the `bins-1` cutoffs of the symmetric log histogram
+    used by `approximate_bounds`, where bin[i] corresponds to the interval
+    [cutoff[i-1], cutoff[i]).
+    """
+    cutoffs = scale * np.power(base, np.arange(0, bins//2-1), dtype=float)
+    cutoffs = np.concatenate([-cutoffs[::-1], [0.0], cutoffs])
+    cutoffs.setflags(write=False)
+    return cutoffs
+
+def _bounds_from_histogram(histogram, cutoffs, threshold):
+    """
+    This function returns the cutoffs enclosing the bins of the noisy 
+    histogram that are above the threshold.
+    """
+    try:
+        has_value = (histogram > threshold).nonzero()[0]
+        first, last = has_value[0] - 1, has_value[-1]
+        return float(cutoffs[first]), float(cutoffs[last])
+    except:
+        raise RuntimeError("Bounds approximation failed.")
+
 def approximate_bounds(x, epsilon=1.0, scale=0.1, base=2, bins=128, p=0.9999):
     """
     This function estimates the upper and lower bounds of the data using a 
@@ -27,26 +53,37 @@ def approximate_bounds(x, epsilon=1.0, scale=0.1, base=2, bins=128, p=0.9999):
     
     # To produce N bins, we need N-1 cutoffs
     #    ...|...|...|...
-    # where bin[i] corresponds to (cutoff[i-1], cutoff[i])
-    cutoffs = scale * np.power(base, np.arange(0, bins//2-1))
-    cutoffs = (-cutoffs[::-1]).tolist() + [0] + cutoffs.tolist()
+    # where bin[i] corresponds to [cutoff[i-1], cutoff[i])
+    cutoffs = _log_cutoffs(scale, base, bins)
     
     # Assign each value to a bin in the log histogram
     histogram = np.random.laplace(size=bins, scale=1.0 / epsilon)
-    x = sorted(x.tolist())
-    for i in range(bins-1):
-        while len(x) > 0 and x[0] < cutoffs[i]:
-            x.pop(0)
-            histogram[i] += 1
-    histogram[-1] += len(x)
+    x = np.asarray(x, dtype=float).ravel()
+    histogram += np.bincount(np.searchsorted(cutoffs, x, side="right"), minlength=bins)
     
     # Get the bins that are above the threshold
-    try:
-        has_value = (histogram > threshold).nonzero()[0]
-        first, last = has_value[0] - 1, has_value[-1]
-        return cutoffs[first], cutoffs[last]
-    except:
-        raise RuntimeError("Bounds approximation failed.")
+    return _bounds_from_histogram(histogram, cutoffs, threshold)
+
+def approximate_column_bounds(X, epsilon=1.0, scale=0.1, base=2, bins=128, p=0.9999):
+    """
+    This function estimates the upper and lower bounds of every column of the 
+    2-D matrix `X` in a single pass. Each column is treated exactly as if it 
+    were passed to `approximate_bounds` with the given `epsilon`, so the total
+    privacy cost is `epsilon * X.shape[1]`. It returns a list of (low, high)
+    tuples, one per column.
+    """
+    threshold = -np.log(2 - 2 * p) / epsilon
+    cutoffs = _log_cutoffs(scale, base, bins)
+
+    # Offset the bin index of each column so a single bincount builds every
+    # histogram at once.
+    X = np.asarray(X, dtype=float)
+    nb_columns = X.shape[1]
+    indices = np.searchsorted(cutoffs, X, side="right") + bins * np.arange(nb_columns)
+    histograms = np.random.laplace(size=(nb_columns, bins), scale=1.0 / epsilon)
+    histograms += np.bincount(indices.ravel(), minlength=bins * nb_columns).reshape(nb_columns, bins)
+
+    return [_bounds_from_histogram(histogram, cutoffs, threshold) for histogram in histograms]
 
 def mean(x, epsilon, delta, bounds=False):
     """
@@ -63,8 +100,16 @@ def mean(x, epsilon, delta, bounds=False):
         bounds = approximate_bounds(x, epsilon)
     low, high = bounds
     x = np.minimum(np.maximum(x, low), high)
+    return noisy_mean(np.sum(x), len(x), epsilon, bounds)
+
+def noisy_mean(total, n, epsilon, bounds):
+    """
+    This function computes the differentially private estimate of the average
+    from the sum of `n` values which have already been clipped to `bounds`.
+    """
+    low, high = bounds
     noise = np.random.laplace() * (high - low) / epsilon
-    mean = (np.sum(x) + noise) / len(x)
+    mean = (total + noise) / n
     return min(max(low, mean), high)
 
 def sum(x, epsilon, delta, bounds=False):
@@ -81,8 +126,16 @@ def sum(x, epsilon, delta, bounds=False):
         bounds = approximate_bounds(x, epsilon)
     low, high = bounds
     x = np.minimum(np.maximum(x, low), high)
+    return noisy_sum(np.sum(x), epsilon, bounds)
+
+def noisy_sum(total, epsilon, bounds):
+    """
+    This function computes the differentially private estimate of the sum of
+    values which have already been clipped to `bounds`.
+    """
+    low, high = bounds
     noise = np.random.laplace() * (high - low) / epsilon
-    return np.sum(x) + noise
+    return total + noise
 
 def median(x, epsilon, delta):
     """
@@ -99,14 +152,8 @@ def median(x, epsilon, delta):
     alpha = epsilon / 2.0
     beta = epsilon / (2.0 * np.log(2.0 / delta))
     
-    x = np.array(x)
-    x.sort()
-    m = (len(x) + 1) // 2
-    smooth_sensitivity = []
-    for k in range(0, len(x)-m):
-        local_sensitivity = max(x[m+t] - x[m+t-k-1] for t in range(0, k+1))
-        smooth_sensitivity.append(np.exp(-k * beta) * local_sensitivity)
-    smooth_sensitivity = max(smooth_sensitivity)
+    x = np.sort(x)
+    smooth_sensitivity = median_smooth_sensitivity(x, beta)
     
     return np.median(x) + smooth_sensitivity/alpha * np.random.laplace()
 
@@ -125,14 +172,8 @@ def median_gaussian(x, epsilon, delta):
     alpha = epsilon / (5.0 * np.sqrt(2.0 * np.log(2.0/delta)))
     beta = epsilon / (4.0 * (1.0 + np.log(2.0/delta)))
     
-    x = np.array(x)
-    x.sort()
-    m = (len(x) + 1) // 2
-    smooth_sensitivity = []
-    for k in range(0, len(x)-m):
-        local_sensitivity = max(x[m+t] - x[m+t-k-1] for t in range(0, k+1))
-        smooth_sensitivity.append(np.exp(-k * beta) * local_sensitivity)
-    smooth_sensitivity = max(smooth_sensitivity)
+    x = np.sort(x)
+    smooth_sensitivity = median_smooth_sensitivity(x, beta)
 
     return np.median(x) + smooth_sensitivity/alpha * np.random.normal()
 
@@ -166,30 +207,171 @@ def sum_sample_and_aggregate(x, epsilon, delta):
     nb_partitions = int(np.sqrt(len(x)))
     return nb_partitions * sample_and_aggregate(x, np.sum, epsilon, nb_partitions, delta)
 
-def finite_categorical(x, domain, epsilon):
+# The prime used by the universal hash family of `local_hash`.
+HASH_PRIME = 2**31 - 1
+
+def encode_categorical(x, domain):
+    """
+    This function maps each value in the np.array `x` to the index of the
+    value in the `domain` sequence and returns the integer codes along with
+    the domain as a np.array. Each value must belong to the domain.
+    """
+    if type(domain) == range:
+        codes = (x - domain.start) // domain.step
+        assert ((codes >= 0) & (codes < len(domain)) & (x == domain[0] + codes * domain.step)).all()
+        return codes, np.arange(domain.start, domain.stop, domain.step)
+
+    domain = list(domain)
+    values = np.asarray(domain)
+    if x.dtype.kind in "biuf" and values.dtype.kind in "biuf" or x.dtype.kind in "US" and values.dtype.kind == x.dtype.kind:
+        sorter = np.argsort(values, kind="stable")
+        assert (values[sorter][1:] != values[sorter][:-1]).all()
+        codes = sorter[np.minimum(np.searchsorted(values, x, sorter=sorter), len(values) - 1)]
+        assert (values[codes] == x).all()
+        return codes, values
+
+    # The values can't be compared as a NumPy array (i.e. a mix of types).
+    index = {value: i for i, value in enumerate(domain)}
+    assert len(index) == len(domain)
+    codes = np.fromiter((index[value] for value in x.tolist()), dtype=int, count=len(x))
+    values = np.empty(len(domain), dtype=object)
+    values[:] = domain
+    return codes, values
+
+def local_hash(a, b, codes, g):
+    """
+    This function hashes the integer codes into `g` buckets using the hash
+    function `((a * code + b) mod HASH_PRIME) mod g`; the parameters may be
+    arrays which are broadcast against each other.
+    """
+    return (a * codes + b) % HASH_PRIME % g
+
+def hashing_range(epsilon, k=None):
+    """
+    This function returns the number of buckets used by `finite_categorical`
+    with the "hashing" encoding for a domain of `k` values, which minimizes
+    the variance of the frequency estimates [1]. Since there is no point in
+    having more buckets than values, the number of buckets is capped at `k`
+    (and at `HASH_PRIME`) so that it stays finite for large epsilons.
+
+    [1] https://www.usenix.org/system/files/conference/usenixsecurity17/sec17-wang-tianhao.pdf
+    """
+    limit = HASH_PRIME if k is None else min(max(k, 2), HASH_PRIME)
+    return max(min(int(round(np.exp(min(epsilon, np.log(limit))))) + 1, limit), 2)
+
+def _randomized_response(codes, k, epsilon):
+    """
+    This function keeps each code with probability `p` and replaces it with
+    a code drawn uniformly from `[0, k)` otherwise; it returns a new array.
+    """
+    # This is (exp(epsilon) - 1) / (exp(epsilon) + k - 1) without overflowing for a large epsilon.
+    p = (1.0 - np.exp(-epsilon)) / (1.0 + (k - 1) * np.exp(-epsilon))
+    flags = np.random.random(size=codes.shape) > p
+    codes = codes.copy()
+    codes[flags] = np.random.randint(0, k, size=np.sum(flags))
+    return codes
+
+def _unary_encoding(codes, k, epsilon, chunk_size=2**20):
+    """
+    This function applies optimized unary encoding [1] to the codes: each code
+    is one-hot encoded, the bit which is set is kept with probability 1/2 and
+    the other bits are set with probability `1 / (exp(epsilon) + 1)`. It returns
+    the bit vectors packed into bytes (see `np.packbits`).
+
+    [1] https://www.usenix.org/system/files/conference/usenixsecurity17/sec17-wang-tianhao.pdf
+    """
+    q = 1.0 / (np.exp(epsilon) + 1.0)
+    packed = np.empty((len(codes), (k + 7) // 8), dtype=np.uint8)
+    step = max(chunk_size // k, 1)
+    for i in range(0, len(codes), step):
+        chunk = codes[i:i + step]
+        bits = np.random.random((len(chunk), k)) < q
+        bits[np.arange(len(chunk)), chunk] = np.random.random(len(chunk)) < 0.5
+        packed[i:i + step] = np.packbits(bits, axis=1)
+    return packed
+
+def _local_hashing(codes, k, epsilon):
+    """
+    This function applies optimized local hashing [1] to the codes: each code
+    is hashed into `hashing_range(epsilon, k)` buckets by a randomly chosen hash
+    function and randomized response is applied to the bucket. It returns an
+    array whose rows contain the hash parameters `a` and `b` and the bucket.
+
+    [1] https://www.usenix.org/system/files/conference/usenixsecurity17/sec17-wang-tianhao.pdf
+    """
+    g = hashing_range(epsilon, k)
+    a = np.random.randint(1, HASH_PRIME, size=len(codes), dtype=np.int64)
+    b = np.random.randint(0, HASH_PRIME, size=len(codes), dtype=np.int64)
+    buckets = _randomized_response(local_hash(a, b, codes.astype(np.int64), g), g, epsilon)
+    return np.stack([a, b, buckets], axis=1)
+
+def finite_categorical(x, domain, epsilon, encoding="direct"):
     """
     This function applies randomized response to a categorical variable. The
     input can be either a np.array or a single value. There is no restriction
     on the value type but in most scenarios, the value will be either an int 
-    or a string.
-    """
-    assert len(set(domain)) == len(domain)
+    or a string. The input array is not modified.
 
-    if type(x) == np.ndarray:
-        for _x in x:
-            assert _x in domain
+    The values are mapped to their index in the domain first (see
+    `encode_categorical`). The "direct" encoding returns values from the
+    domain, which is only useful for small domains since the probability of
+    reporting the true value decreases with the size of the domain. For
+    large domains, the "unary" and "hashing" encodings return the packed bit
+    vectors of `_unary_encoding` and the hashes of `_local_hashing`; they
+    require the domain to be a sequence so that the server can decode them
+    (see `tiresias.server.handler.bounded`).
+    """
+    if type(x) != np.ndarray:
+        if encoding != "direct":
+            return finite_categorical(np.array([x]), domain, epsilon, encoding)[0]
+        assert len(set(domain)) == len(domain)
+        assert x in domain
+        if epsilon == float("inf"):
+            return x
         p = (np.exp(epsilon) - 1) / (len(domain) - 1 + np.exp(epsilon))
-        flags = np.random.random(size=x.shape) > p
-        x[flags] = np.random.choice(list(domain), size=np.sum(flags))
-        return x
+        if np.random.random() < p:
+            return x
+        domain = list(domain)
+        return domain[np.random.randint(len(domain))]
+
+    codes, values = encode_categorical(x, domain)
+    if encoding == "unary":
+        return _unary_encoding(codes, len(values), epsilon)
+    elif encoding == "hashing":
+        return _local_hashing(codes, len(values), epsilon)
+    elif encoding != "direct":
+        raise ValueError("Unknown encoding.")
 
-    assert x in domain
     if epsilon == float("inf"):
-        return x
-    p = (np.exp(epsilon) - 1) / (len(domain) - 1 + np.exp(epsilon))
-    if np.random.random() < p:
-        return x
-    return np.random.choice(list(domain))
+        return x.copy()
+    flags = np.random.random(size=x.shape) > (np.exp(epsilon) - 1) / (len(values) - 1 + np.exp(epsilon))
+    y = x.astype(np.result_type(x, values))
+    y[flags] = values[np.random.randint(0, len(values), size=np.sum(flags))]
+    return y
+
+def estimate_frequencies(support, n, k, epsilon, encoding="direct"):
+    """
+    This function computes unbiased estimates of the fraction of the `n`
+    values which are equal to each of the `k` values in the domain, where
+    `support[i]` is the number of reports returned by `finite_categorical`
+    with the given encoding that support the i-th value (i.e. the reports
+    equal to it, the bit vectors with the i-th bit set or the hashes that
+    match it). The estimates aren't clipped so they may be negative.
+    """
+    if encoding == "direct":
+        if epsilon == float("inf"):
+            p, q = 1.0, 0.0
+        else:
+            keep = (np.exp(epsilon) - 1) / (k - 1 + np.exp(epsilon))
+            p, q = keep + (1 - keep) / k, (1 - keep) / k
+    elif encoding == "unary":
+        p, q = 0.5, 1.0 / (np.exp(epsilon) + 1.0)
+    elif encoding == "hashing":
+        g = hashing_range(epsilon, k)
+        p, q = 1.0 / (1.0 + (g - 1) * np.exp(-epsilon)), 1.0 / g
+    else:
+        raise ValueError("Unknown encoding.")
+    return (np.asarray(support, dtype=float) / max(n, 1) - q) / (p - q)
 
 def bounded_continuous(x, low, high, epsilon):
     """
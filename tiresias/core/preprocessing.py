@@ -0,0 +1,30 @@
+"""
+This module contains the preprocessing steps shared by the integrated models
+in `tiresias.core.classification` and `tiresias.core.regression`. None of the
+functions modify their input; they return the input itself if there is
+nothing to clip and a new array otherwise.
+"""
+import numpy as np
+
+def clip_norms(X, max_norm, norms=None):
+    """
+    This function scales down the rows of the 2-D matrix `X` whose L2 norm is
+    greater than `max_norm` so that their norm is just below it. The `norms`
+    of the rows can be given if they have already been computed.
+    """
+    if norms is None:
+        norms = np.linalg.norm(X, axis=1)
+    over = norms > max_norm
+    if not over.any():
+        return X
+    scale = np.ones(len(norms))
+    scale[over] = (max_norm - 1e-5) / norms[over]
+    return X * scale[:, np.newaxis]
+
+def clip_columns(X, bounds):
+    """
+    This function clips each column of the 2-D matrix `X` to the corresponding
+    (low, high) tuple in `bounds`.
+    """
+    low, high = np.array(bounds, dtype=float).T
+    return np.minimum(np.maximum(X, low), high)
@@ -1,6 +1,7 @@
 import numpy as np
 import diffprivlib.models as dp
 from tiresias.core.mechanisms import approximate_bounds
+from tiresias.core.preprocessing import clip_norms
 
 class LinearRegression(dp.LinearRegression):
 
@@ -11,7 +12,5 @@ class LinearRegression(dp.LinearRegression):
             row_norms = np.linalg.norm(X, axis=1)
             _, max_norm = approximate_bounds(row_norms, self.epsilon)
             self.data_norm = max_norm
-            for i in range(X.shape[0]):
-                if np.linalg.norm(X[i]) > self.data_norm:
-                    X[i] = X[i] * (self.data_norm - 1e-5) / np.linalg.norm(X[i])
+            X = clip_norms(X, self.data_norm, row_norms)
         return super().fit(X, y, sample_weight=sample_weight)
@@ -0,0 +1,49 @@
+"""
+This module provides functions for computing the smooth sensitivity of
+statistics, as defined in [1], which is used to calibrate the noise added by
+the median mechanisms.
+
+[1] http://www.cse.psu.edu/~ads22/pubs/NRS07/NRS07-full-draft-v1.pdf
+"""
+import numpy as np
+
+def median_smooth_sensitivity(x, beta):
+    """
+    This function computes the beta-smooth sensitivity of the median of the
+    sorted array `x` using the derivation found on page 12 of [1].
+
+    The smooth sensitivity is the largest value of
+    `exp(-(j-i-1)*beta) * (x[j] - x[i])` over the pairs `i < m <= j` which
+    are at most `n-m` positions apart, where `m` is the index of the median.
+    The `j` which maximizes it never decreases as `i` increases, so we find
+    it for the middle `i` with a vectorized scan and recurse on both halves
+    with the range of `j` split at that point; this takes O(n log n) time
+    (see section 3.1 of [1]) whatever the value of `beta`. The subproblems
+    which can't beat the running maximum are skipped.
+
+    [1] http://www.cse.psu.edu/~ads22/pubs/NRS07/NRS07-full-draft-v1.pdf
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    m = (n + 1) // 2
+    if n - m < 1:
+        raise ValueError("Smooth sensitivity requires at least two values.")
+
+    smooth_sensitivity = 0.0
+    stack = [(2 * m - n, m - 1, m, n - 1)]
+    while stack:
+        i_low, i_high, j_low, j_high = stack.pop()
+        if i_low > i_high:
+            continue
+        # Skip the subproblems whose values can't exceed the running maximum.
+        if np.exp(-max(j_low - i_high - 1, 0) * beta) * (x[j_high] - x[i_low]) <= smooth_sensitivity:
+            continue
+        i = (i_low + i_high) // 2
+        j = np.arange(j_low, min(j_high, i + n - m) + 1)
+        values = np.exp(-(j - i - 1) * beta) * (x[j] - x[i])
+        # Break ties in favor of the largest `j` so that the rows above `i` keep every candidate.
+        best = len(values) - 1 - np.argmax(values[::-1])
+        smooth_sensitivity = max(smooth_sensitivity, values[best])
+        stack.append((i_low, i - 1, j_low, j[best]))
+        stack.append((i + 1, i_high, j[best], j_high))
+    return float(smooth_sensitivity)
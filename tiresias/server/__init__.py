@@ -1,14 +1,20 @@
 import os
 import threading
 import numpy as np
-from time import sleep
 from json import loads, dumps
-from bottle import Bottle, request, response, static_file
+from bottle import Bottle, request, response, static_file, abort
 from tiresias.server.platform import Platform
+from tiresias.server.store import SQLiteStore
 
-def run(port=3000):
+MAX_POLL_TIMEOUT = 60.0
+
+def run(port=3000, database=None, threads=64):
     api = Bottle()
-    platform = Platform()
+    platform = Platform(store=SQLiteStore(database) if database else None)
+    # Each long poll holds on to a worker thread while it waits, so only half of the workers can
+    # be waiting at once and the other polls are answered right away; otherwise the pollers would
+    # starve the requests which create tasks and submit data.
+    pollers = threading.BoundedSemaphore(max(threads // 2, 1))
 
     @api.route("/")
     def _index():
@@ -22,26 +28,88 @@ def run(port=3000):
 
     @api.route("/list")
     def _list():
+        """
+        List the pending tasks. If a `since` cursor is given, block for up to `timeout` seconds
+        until a task has changed and return the new cursor along with the tasks which have changed
+        since the given cursor (see `Platform.changes`). If too many clients are already waiting,
+        the changes are returned without blocking, so clients should back off when there are none.
+        """
+        response.content_type = "application/json"
+        if "since" not in request.params:
+            return dumps(platform.tasks(only_pending=True), indent=2)
+        since = int(request.params.get("since"))
+        timeout = min(max(float(request.params.get("timeout", 30.0)), 0.0), MAX_POLL_TIMEOUT)
+        waiting = pollers.acquire(blocking=False)
+        try:
+            cursor, tasks = platform.changes(since, timeout=timeout if waiting else 0.0)
+        finally:
+            if waiting:
+                pollers.release()
+        return dumps({"cursor": cursor, "tasks": tasks})
+
+    @api.route("/metrics")
+    def _metrics():
         response.content_type = "application/json"
-        return dumps(platform.tasks(only_pending=True), indent=2)
+        return dumps(platform.metrics(), indent=2)
+
+    def _body(name):
+        """
+        Read the named parameter from the query string for GET requests. For POST requests, the
+        body is either JSON or, for `application/octet-stream`, passed through as a bytearray so
+        that `tiresias.core.codec.decode` can use it without copying it.
+        """
+        if request.method != "POST":
+            return loads(request.params.get(name))
+        if request.content_type.startswith("application/octet-stream"):
+            body = bytearray(request.content_length)
+            request.body.readinto(body)
+            return body
+        return loads(request.body.read())
 
-    @api.route("/task")
+    @api.route("/task", method=["GET", "POST"])
     def _create_task():
-        task = loads(request.params.get("task"))
+        task = _body("task")
         return platform.create(task)
 
     @api.route("/task/<task_id>")
     def _fetch_task(task_id):
         return platform.fetch(task_id)
 
-    @api.route("/task/<task_id>/submit")
+    @api.route("/task/<task_id>/submit", method=["GET", "POST"])
     def _approve_task(task_id):
-        payload = loads(request.params.get("payload"))
-        return platform.submit(task_id, payload)
+        payload = _body("payload")
+        try:
+            accepted = platform.submit(task_id, payload)
+        except ValueError as e:
+            abort(400, str(e))
+        response.content_type = "application/json"
+        return dumps(accepted)
+
+    @api.route("/submit", method="POST")
+    def _approve_tasks():
+        """
+        Submit the payloads for several tasks at once; the body is a JSON object mapping each task
+        id to its payload and the response maps each task id to whether it was accepted.
+        """
+        payloads = _body("payloads")
+        if not isinstance(payloads, dict):
+            abort(400, "Expected an object mapping task ids to payloads.")
+        accepted = {}
+        for task_id, payload in payloads.items():
+            try:
+                accepted[task_id] = platform.submit(task_id, payload)
+            except Exception:
+                # An unknown task or a malformed payload only rejects that item, not the batch.
+                accepted[task_id] = False
+        response.content_type = "application/json"
+        return dumps(accepted)
 
-    api_thread = threading.Thread(target=api.run, kwargs={"port": port, "server": "paste", "host": "0.0.0.0"})
+    api_thread = threading.Thread(target=api.run, kwargs={"port": port, "server": "paste", "host": "0.0.0.0",
+        # Each long-polling client holds on to a worker thread while it waits.
+        "threadpool_workers": threads})
     api_thread.start()
     while api_thread.is_alive():
+        platform.wait(timeout=1.0)
         platform.gc()
-        platform.run()
-        sleep(0.5)
+        platform.run(block=False)
+    platform.shutdown()
@@ -1,8 +1,8 @@
 from tiresias.core import b64_encode, b64_decode
-from tiresias.server.handler.basic import handle_basic
-from tiresias.server.handler.bounded import handle_bounded
-from tiresias.server.handler.integrated import handle_integrated
-from tiresias.server.handler.gradient import handle_gradient
+from tiresias.server.handler.basic import handle_basic, BasicAccumulator
+from tiresias.server.handler.bounded import handle_bounded, BoundedAccumulator
+from tiresias.server.handler.integrated import handle_integrated, validate_integrated
+from tiresias.server.handler.gradient import handle_gradient, validate_gradient
 
 def handle_task(task, data):
     dispatcher = {
@@ -19,3 +19,26 @@ def handle_task(task, data):
         return func(task, data), None
     except Exception as e:
         return None, e
+
+def validate_payload(task, payload):
+    """
+    Raise a ValueError if the payload can't be handled so that it's rejected when it's submitted
+    instead of failing the task once it runs. The accumulators validate their own payloads.
+    """
+    validators = {
+        "integrated": validate_integrated,
+        "gradient": validate_gradient,
+    }
+    if task["type"] in validators:
+        validators[task["type"]](task, payload)
+
+def create_payloads(task):
+    """
+    Return the container which collects the payloads submitted for the task. This is a list of the
+    raw payloads unless the task can be aggregated incrementally as the payloads arrive.
+    """
+    if task.get("type") == "basic" and BasicAccumulator.supports(task):
+        return BasicAccumulator(task)
+    if task.get("type") == "bounded" and BoundedAccumulator.supports(task):
+        return BoundedAccumulator(task)
+    return []
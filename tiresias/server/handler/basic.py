@@ -1,6 +1,58 @@
+import copy
+import numpy as np
 import tiresias.core.mechanisms as mechanisms
 
+class BasicAccumulator(object):
+    """
+    The BasicAccumulator folds each submission for a `count`, `sum` or `mean` task into a running
+    clipped sum and count as it arrives, so the server only keeps a constant amount of state per
+    task and only has to add the noise once the task is complete. The `sum` and `mean` aggregators
+    require the task to provide its own `bounds` since the bounds can't be estimated incrementally.
+    """
+
+    def __init__(self, task):
+        self.aggregator = task.get("aggregator")
+        self.bounds = task.get("bounds")
+        self.nb_payloads = 0
+        self.nb_values = 0
+        self.total = 0.0
+
+    @staticmethod
+    def supports(task):
+        if task.get("aggregator") == "count":
+            return True
+        return task.get("aggregator") in ["sum", "mean"] and bool(task.get("bounds"))
+
+    def append(self, payload):
+        if self.aggregator == "count":
+            # A count only needs the number of values, which can be of any type.
+            self.nb_values += len(payload)
+        else:
+            values = np.asarray(payload, dtype=float).ravel()
+            values = np.minimum(np.maximum(values, self.bounds[0]), self.bounds[1])
+            self.total += float(np.sum(values))
+            self.nb_values += len(values)
+        self.nb_payloads += 1
+
+    def copy(self):
+        return copy.copy(self)
+
+    def __len__(self):
+        return self.nb_payloads
+
+    def finalize(self, task):
+        if task["aggregator"] == "count":
+            return mechanisms.laplace_noise(self.nb_values, sensitivity=1, epsilon=task["epsilon"])
+        elif task["aggregator"] == "sum":
+            return mechanisms.noisy_sum(self.total, task["epsilon"], self.bounds)
+        elif task["aggregator"] == "mean":
+            return mechanisms.noisy_mean(self.total, self.nb_values, task["epsilon"], self.bounds)
+        raise ValueError("Unknown aggregator.")
+
 def handle_basic(task, data):
+    if isinstance(data, BasicAccumulator):
+        return data.finalize(task)
+
     dispatcher = {
         "mean": mechanisms.mean,
         "median": mechanisms.median,
@@ -14,4 +66,6 @@ def handle_basic(task, data):
     values = []
     for row in data:
         values.extend(row)
+    if task["aggregator"] in ["mean", "sum"] and task.get("bounds"):
+        return func(values, task["epsilon"], task["delta"], bounds=task["bounds"])
     return func(values, task["epsilon"], task["delta"])
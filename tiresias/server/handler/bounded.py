@@ -1,4 +1,126 @@
-def handle_bounded(query, data):
+import copy
+import numpy as np
+import tiresias.core.mechanisms as mechanisms
+
+class BoundedAccumulator(object):
+    """
+    The BoundedAccumulator summarizes the rows submitted for a bounded task as they arrive instead
+    of keeping them around. For each `range` column, it keeps the count and the sum of the values;
+    since the noise added by the clients has zero mean, the mean of the values is unbiased. For each
+    `set` column, it keeps the number of reports which support each value in the domain so that the
+    frequencies can be estimated once the task is complete (see `mechanisms.estimate_frequencies`).
+    The task opts in by setting the `aggregator` to `summary`.
+    """
+
+    def __init__(self, task):
+        self.epsilon = task["epsilon"]
+        self.nb_payloads = 0
+        self.columns = {}
+        for key, bounds in task["bounds"].items():
+            column = {"type": bounds["type"], "count": 0}
+            if bounds["type"] == "range":
+                column["total"] = 0.0
+            elif bounds["type"] == "set":
+                # This matches the domain which the client encodes the values against.
+                column["domain"] = list(dict.fromkeys(list(bounds["values"]) + [bounds["default"]]))
+                column["encoding"] = bounds.get("encoding", "direct")
+                column["support"] = np.zeros(len(column["domain"]), dtype=np.int64)
+            else:
+                raise ValueError("Unknown bounds.")
+            self.columns[key] = column
+
+    @staticmethod
+    def supports(task):
+        return task.get("aggregator") == "summary" and bool(task.get("bounds"))
+
+    def append(self, payload):
+        # Compute the contribution of every column before applying any of them so that a payload
+        # which is rejected (i.e. raises) doesn't leave the accumulator partially updated.
+        contributions = {}
+        for key, column in self.columns.items():
+            values = [row[key] for row in payload if key in row]
+            if values:
+                contributions[key] = self._contribution(column, values)
+        for key, (count, delta) in contributions.items():
+            column = self.columns[key]
+            column["total" if column["type"] == "range" else "support"] += delta
+            column["count"] += count
+        self.nb_payloads += 1
+
+    def _contribution(self, column, values):
+        """
+        Return the number of values and the amount to add to the total (for ranges) or support (for
+        sets); raises ValueError if the values aren't valid reports.
+        """
+        if column["type"] == "range":
+            values = np.asarray(values, dtype=float)
+            if values.ndim != 1 or not np.isfinite(values).all():
+                raise ValueError("Expected finite numbers.")
+            return len(values), float(np.sum(values))
+        return self._support(column, values)
+
+    def _support(self, column, values, chunk_size=2**20):
+        k = len(column["domain"])
+        if column["encoding"] == "unary":
+            bits = np.asarray(values, dtype=np.int64)
+            if bits.shape != (len(values), (k + 7) // 8) or ((bits < 0) | (bits > 255)).any():
+                raise ValueError("Expected packed bit vectors.")
+            bits = np.unpackbits(bits.astype(np.uint8), axis=1, count=k)
+            return len(values), bits.sum(axis=0, dtype=np.int64)
+
+        if column["encoding"] == "hashing":
+            g = mechanisms.hashing_range(self.epsilon, k)
+            reports = np.asarray(values, dtype=np.int64)
+            if reports.shape != (len(values), 3) or (reports < 0).any() or (reports[:, 0] < 1).any() \
+                    or (reports[:, :2] >= mechanisms.HASH_PRIME).any() or (reports[:, 2] >= g).any():
+                raise ValueError("Expected hashed reports.")
+            codes = np.arange(k, dtype=np.int64)
+            support = np.zeros(k, dtype=np.int64)
+            step = max(chunk_size // k, 1)
+            for i in range(0, len(reports), step):
+                a, b, buckets = reports[i:i + step, :, None].transpose(1, 0, 2)
+                support += (mechanisms.local_hash(a, b, codes, g) == buckets).sum(axis=0)
+            return len(values), support
+
+        # Only the values in the domain are counted since the others can't be decoded.
+        index = {value: i for i, value in enumerate(column["domain"])}
+        codes = [index[value] for value in values if value in index]
+        return len(codes), np.bincount(codes, minlength=k)
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    def __len__(self):
+        return self.nb_payloads
+
+    def finalize(self, task):
+        summary = {}
+        for key, column in self.columns.items():
+            if column["type"] == "range":
+                mean = column["total"] / column["count"] if column["count"] else None
+                summary[key] = {"type": "range", "count": column["count"], "mean": mean}
+                continue
+            frequencies = mechanisms.estimate_frequencies(column["support"], column["count"],
+                len(column["domain"]), task["epsilon"], column["encoding"])
+            summary[key] = {
+                "type": "set",
+                "count": column["count"],
+                "frequencies": dict(zip(column["domain"], frequencies.tolist())),
+            }
+        return summary
+
+def handle_bounded(task, data):
+    """
+    Return the rows submitted for the task or, if the task's `aggregator` is `summary`, the
+    estimated means and frequencies of the columns (see `BoundedAccumulator`).
+    """
+    if BoundedAccumulator.supports(task) and not isinstance(data, BoundedAccumulator):
+        payloads, data = data, BoundedAccumulator(task)
+        for payload in payloads:
+            data.append(payload)
+    if isinstance(data, BoundedAccumulator):
+        return data.finalize(task)
+
     values = []
     for row in data:
         values.extend(row)
@@ -1,12 +1,35 @@
 import torch
 import numpy as np
-from tiresias.core import b64_decode, b64_encode
+from functools import lru_cache
+from tiresias.core import b64_decode, b64_encode, b64_decode_arrays, codec
 from tiresias.core.gradients import merge_gradients, put_gradients
 
+def _decode(gradients):
+    if isinstance(gradients, (bytes, bytearray)):
+        return codec.decode(gradients)
+    return b64_decode_arrays(gradients)
+
+@lru_cache(maxsize=16)
+def _shapes(model):
+    return [tuple(p.shape) for p in b64_decode(model).parameters() if p.requires_grad]
+
+def validate_gradient(task, gradients):
+    """
+    Raise a ValueError unless the payload decodes to one finite gradient per model parameter.
+    """
+    try:
+        gradients = _decode(gradients)
+    except Exception as e:
+        raise ValueError("Unable to decode the gradients.") from e
+    if [tuple(g.shape) for g in gradients] != _shapes(task["model"]):
+        raise ValueError("The gradients don't match the model parameters.")
+    if not all(np.isfinite(np.asarray(g)).all() for g in gradients):
+        raise ValueError("The gradients should be finite.")
+
 def handle_gradient(task, data):
     model = b64_decode(task["model"])
     optimizer = torch.optim.Adam(model.parameters(), lr=task["lr"])
-    put_gradients(model, merge_gradients([b64_decode(g) for g in data]))
+    put_gradients(model, merge_gradients([_decode(g) for g in data]))
     torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
     optimizer.step()
     return b64_encode(model)
@@ -2,12 +2,32 @@ import numpy as np
 from tiresias.core.regression import LinearRegression
 from tiresias.core.classification import LogisticRegression, GaussianNB, TiresiasClassifier
 
+def _to_arrays(payload, inputs, output):
+    # Each payload is either a list of rows or a dictionary of columns.
+    if isinstance(payload, dict):
+        x = np.column_stack([np.asarray(payload[var]) for var in inputs])
+        y = np.asarray(payload[output])
+    else:
+        x = np.array([[row[var] for var in inputs] for row in payload])
+        y = np.array([row[output] for row in payload])
+    return x.reshape(len(y), len(inputs)), y
+
+def validate_integrated(task, payload):
+    """
+    Raise a ValueError unless the payload contains a numeric value for each input and an output
+    for each row.
+    """
+    try:
+        x, y = _to_arrays(payload, task["inputs"], task["output"])
+    except Exception as e:
+        raise ValueError("Expected rows or columns containing the inputs and the output.") from e
+    if x.dtype.kind not in "biuf" or y.ndim != 1:
+        raise ValueError("Expected numeric inputs and a single output.")
+
 def handle_integrated(task, data):
-    rows = []
-    for row in data:
-        rows.extend(row)
-    x = np.array([[row[var] for var in task["inputs"]] for row in rows])
-    y = np.array([row[task["output"]] for row in rows])
+    arrays = [_to_arrays(payload, task["inputs"], task["output"]) for payload in data if len(payload)]
+    x = np.concatenate([x for x, _ in arrays])
+    y = np.concatenate([y for _, y in arrays])
 
     if task["model"] == "GaussianNB":
         clf = GaussianNB(epsilon=task["epsilon"])
@@ -25,7 +45,8 @@ def handle_integrated(task, data):
         return clf
 
     elif task["model"] == "Classification":
-        clf = TiresiasClassifier(epsilon=task["epsilon"])
+        clf = TiresiasClassifier(epsilon=task["epsilon"], candidates=task.get("candidates"),
+            n_jobs=task.get("n_jobs", 1), refit=task.get("refit", True))
         clf.fit(x, y)
         return clf
 
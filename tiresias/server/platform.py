@@ -1,9 +1,16 @@
 import uuid
+import heapq
+import bisect
 import threading
+import multiprocessing
 from time import time
 from enum import Enum
+from collections import deque, Counter
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from tiresias.core import b64_encode
-from tiresias.server.handler import handle_task
+from tiresias.server.handler import handle_task, validate_payload
+from tiresias.server.store import MemoryStore
 
 class State:
     ERROR = 'ERROR'
@@ -11,57 +18,252 @@ class State:
     PENDING = 'PENDING'
     COMPLETE = 'COMPLETE'
 
+class Scheduler(object):
+
+    def __init__(self, max_threads=4, max_processes=2, process_types=("integrated", "gradient"), limits=None):
+        """
+        The Scheduler object executes task handlers outside of the platform lock. Cheap aggregators
+        run in a thread pool while the task types listed in `process_types` (i.e. model fitting) run
+        in a process pool. The optional `limits` dictionary caps the number of tasks of each type
+        that can run concurrently; the remaining tasks wait in a FIFO queue.
+        """
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._running = Counter()
+        self._completed = Counter()
+        self._limits = limits or {}
+        self._process_types = set(process_types)
+        self._max_threads = max_threads
+        self._max_processes = max_processes
+        self._threads = None
+        self._processes = None
+
+    def _executor(self, task_type):
+        if task_type in self._process_types and self._max_processes > 0:
+            if not self._processes:
+                context = multiprocessing.get_context("spawn")
+                self._processes = ProcessPoolExecutor(self._max_processes, mp_context=context)
+            return self._processes
+        if not self._threads:
+            self._threads = ThreadPoolExecutor(self._max_threads)
+        return self._threads
+
+    def submit(self, task, payloads, callback):
+        """
+        Queue the task for execution and return a future which is resolved once the handler has
+        finished and `callback(task, result, err)` has returned.
+        """
+        done = Future()
+        with self._lock:
+            self._queue.append((task, payloads, callback, done))
+        self._dispatch()
+        return done
+
+    def _dispatch(self):
+        # Pick the jobs to start while holding the lock but submit them after releasing it since
+        # the done callback runs immediately if the job has already finished.
+        starting, deferred = [], deque()
+        with self._lock:
+            while self._queue:
+                job = self._queue.popleft()
+                task_type = job[0]["type"]
+                if self._running[task_type] >= self._limits.get(task_type, float("inf")):
+                    deferred.append(job)
+                    continue
+                self._running[task_type] += 1
+                starting.append((self._executor(task_type), job))
+            self._queue = deferred
+        for executor, job in starting:
+            try:
+                future = executor.submit(handle_task, job[0], job[1])
+            except Exception as e:
+                # The pool is broken (i.e. a worker died) or shut down; fail the job so that it's
+                # no longer counted as running and the next jobs get a new pool.
+                self._discard(executor)
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda future, job=job, executor=executor: self._finish(job, future, executor))
+
+    def _discard(self, executor):
+        with self._lock:
+            if executor is self._processes:
+                self._processes = None
+            elif executor is self._threads:
+                self._threads = None
+            else:
+                return
+        executor.shutdown(wait=False)
+
+    def _finish(self, job, future, executor):
+        task, payloads, callback, done = job
+        try:
+            result, err = future.result()
+        except BrokenProcessPool as e:
+            self._discard(executor)
+            result, err = None, e
+        except Exception as e:
+            result, err = None, e
+        with self._lock:
+            self._running[task["type"]] -= 1
+            self._completed[task["type"]] += 1
+        self._dispatch()
+        try:
+            callback(task, result, err)
+        finally:
+            done.set_result(None)
+
+    def metrics(self):
+        """
+        Return the number of queued, running, and completed tasks for each task type.
+        """
+        with self._lock:
+            queued = Counter(job[0]["type"] for job in self._queue)
+            return {
+                "queued": dict(queued),
+                "running": {k: v for k, v in self._running.items() if v > 0},
+                "completed": dict(self._completed),
+                "queue_depth": len(self._queue),
+            }
+
+    def shutdown(self, wait=True):
+        """
+        Shut down the worker pools.
+        """
+        for executor in [self._threads, self._processes]:
+            if executor:
+                executor.shutdown(wait=wait)
+
 class Platform(object):
 
-    def __init__(self):
+    def __init__(self, scheduler=None, store=None):
         """
         The Platform object is responsible for managing and executing tasks. It's designed to work
-        with a multi-threaded web server and stores everything in-memory.
+        with a multi-threaded web server and keeps the task metadata in-memory. Tasks are executed by
+        the `scheduler`, which defaults to a `Scheduler` with the default pool sizes, and the payloads
+        are kept by the `store`, which defaults to a `MemoryStore`. Any tasks found in the store are
+        recovered; tasks which were running when the server stopped are executed again.
         """
         self._lock = threading.RLock()
         self._tasks = {}
-        self._payloads = {}
+        self._store = store or MemoryStore()
+        self._scheduler = scheduler or Scheduler()
+        self._ready = deque()
+        self._wakeup = threading.Condition(self._lock)
+        self._expiry = []
+
+        # Every time a task is created or changes state, it is stamped with a new version and
+        # appended to the changelog so that `changes` can return the delta since a cursor. The
+        # versions start from the current time in microseconds so cursors from a previous run of
+        # the server remain valid.
+        self._version = int(time() * 1e6)
+        self._changelog = []
+        self._changed = threading.Condition(self._lock)
+        self._recover()
+
+    def _recover(self):
+        with self._lock:
+            for tid, task in self._store.load().items():
+                if task["status"] == State.RUNNING:
+                    task["status"] = State.PENDING
+                self._tasks[tid] = task
+                self._touch(tid)
+                if task["status"] == State.PENDING and task["count"] >= task.get("min_count", 0):
+                    self._signal(tid)
+                elif task["status"] == State.COMPLETE:
+                    heapq.heappush(self._expiry, (task["start"], tid))
 
     def gc(self, timeout=60):
         """
         Delete the data for any completed tasks and delete any completed tasks that have passed the
-        timeout window.
+        timeout window. Completed tasks are kept in a heap ordered by their start time so this only
+        touches the tasks which have actually expired. This also flushes any buffered payloads to
+        the store.
+        """
+        with self._lock:
+            while self._expiry and time() - self._expiry[0][0] > timeout:
+                _, tid = heapq.heappop(self._expiry)
+                self._tasks.pop(tid, None)
+                self._store.delete(tid)
+            self._store.flush()
+
+            # Drop the changelog entries for deleted tasks and tasks which have changed since.
+            if len(self._changelog) > 2 * len(self._tasks) + 1024:
+                self._changelog = [(version, tid) for version, tid in self._changelog
+                    if tid in self._tasks and self._tasks[tid]["version"] == version]
+
+    def wait(self, timeout=None):
+        """
+        Block until at least one task has collected enough data to run or until the timeout has
+        passed. Returns whether there are tasks ready to run.
         """
         with self._lock:
-            for tid in set(self._tasks.keys()):
-                if self._tasks[tid]["status"] == State.COMPLETE:
-                    if time() - self._tasks[tid]["start"] > timeout:
-                        del self._tasks[tid]
-                        del self._payloads[tid]
+            return self._wakeup.wait_for(lambda: len(self._ready) > 0, timeout=timeout)
     
-    def run(self):
+    def run(self, block=True):
         """
-        Examing the pending tasks and, if there's enough data, start processing the task. Note that
-        the task handler will block the platform accepting new tasks and/or data; at some point, we 
-        will need to move the task handler into its own process.
+        Hand the tasks which have collected enough data over to the scheduler. The tasks are marked
+        as running while holding the lock and their payloads are read after releasing it; the task
+        handlers run in the scheduler's worker pools, so the platform keeps accepting new tasks and
+        data while they execute. If `block` is set, wait for the dispatched tasks to finish before
+        returning.
         """
+        starting = []
         with self._lock:
-            for tid in self.tasks(only_pending=True):
-                if self._tasks[tid]["count"] < self._tasks[tid]["min_count"]:
+            while self._ready:
+                tid = self._ready.popleft()
+                if tid not in self._tasks or self._tasks[tid]["status"] != State.PENDING:
                     continue
                 self._tasks[tid]["status"] = State.RUNNING
-                result, err = handle_task(self._tasks[tid], self._payloads[tid])
-                if err:
-                    self._tasks[tid]["status"] = State.ERROR
-                    self._tasks[tid]["result"] = repr(err)
-                else:
-                    self._tasks[tid]["result"] = b64_encode(result)
-                    self._tasks[tid]["status"] = State.COMPLETE
-                    self._tasks[tid]["end"] = time()
-    
+                self._touch(tid)
+                self._store.update(self._tasks[tid])
+                starting.append(dict(self._tasks[tid]))
+
+        # The running tasks don't accept any more payloads, so they can be read without the lock.
+        futures = []
+        for task in starting:
+            futures.append(self._scheduler.submit(task, self._store.payloads(task["id"]), self._complete))
+        if block:
+            wait(futures)
+
+    def _complete(self, task, result, err):
+        """
+        Write the result of a task back to the platform.
+        """
+        if err:
+            update = {"status": State.ERROR, "result": repr(err)}
+        else:
+            update = {"status": State.COMPLETE, "result": b64_encode(result), "end": time()}
+        with self._lock:
+            if task["id"] in self._tasks:
+                self._tasks[task["id"]].update(update)
+                self._touch(task["id"])
+                self._store.update(self._tasks[task["id"]])
+                if update["status"] == State.COMPLETE:
+                    heapq.heappush(self._expiry, (task["start"], task["id"]))
+
+    def metrics(self):
+        """
+        Return the scheduler metrics along with the number of tasks in each state.
+        """
+        with self._lock:
+            metrics = self._scheduler.metrics()
+            metrics["tasks"] = dict(Counter(task["status"] for task in self._tasks.values()))
+            return metrics
+
+    def shutdown(self):
+        """
+        Stop the scheduler's worker pools and close the store.
+        """
+        self._scheduler.shutdown()
+        with self._lock:
+            self._store.close()
+
     def tasks(self, only_pending=False):
         """
-        Return a list of tasks.
+        Return a snapshot of the tasks.
         """
         with self._lock:
-            if not only_pending:
-                return self._tasks
-            return {k: v for k, v in self._tasks.items() if v["status"] == State.PENDING}
+            return {k: dict(v) for k, v in self._tasks.items() if not only_pending or v["status"] == State.PENDING}
     
     def create(self, task):
         """
@@ -73,24 +275,68 @@ class Platform(object):
             task["start"] = time()
             task["count"] = 0
             self._tasks[task["id"]] = task
-            self._payloads[task["id"]] = []
+            self._touch(task["id"])
+            self._store.create(task)
+            if task.get("min_count", 0) <= 0:
+                self._signal(task["id"])
             return task["id"]
     
+    def changes(self, since=0, timeout=None):
+        """
+        Return a tuple containing a cursor and the tasks which have been created or have changed
+        state since the given cursor. If nothing has changed, block until a task changes or until
+        the timeout has passed. Pending tasks are returned in full whereas tasks which are no
+        longer pending only contain their id and status.
+        """
+        with self._lock:
+            if since > self._version:
+                since = 0
+            self._changed.wait_for(lambda: self._version > since, timeout=timeout)
+            tasks = {}
+            start = bisect.bisect_right(self._changelog, (since, chr(0x10FFFF)))
+            for version, tid in self._changelog[start:]:
+                if tid not in self._tasks or self._tasks[tid]["version"] != version:
+                    continue
+                task = self._tasks[tid]
+                if task["status"] == State.PENDING:
+                    tasks[tid] = dict(task)
+                else:
+                    tasks[tid] = {"id": tid, "status": task["status"], "version": version}
+            return self._version, tasks
+
     def fetch(self, task_id):
         """
-        Fetch a specific task.
+        Fetch a snapshot of a specific task.
         """
         with self._lock:
-            return self._tasks[task_id]
+            return dict(self._tasks[task_id])
 
     def submit(self, task_id, payload):
         """
-        Store the data for a specific task in-memory and update the counters.
+        Store the data for a specific task and update the counters. Once the count reaches
+        `min_count`, the task is queued and anyone blocked in `wait` is woken up. A ValueError is
+        raised if the payload is malformed (see `tiresias.server.handler.validate_payload`).
         """
         with self._lock:
             task = self._tasks[task_id]
+        # Decoding the payload can be slow so it's validated without holding the lock.
+        validate_payload(task, payload)
+        with self._lock:
             if task["status"] != State.PENDING:
                 return False
-            self._payloads[task_id].append(payload)
-            self._tasks[task_id]["count"] = len(self._payloads[task_id])
+            self._tasks[task_id]["count"] = self._store.append(task_id, payload)
+            if task["count"] == task["min_count"]:
+                self._signal(task_id)
             return True
+
+    def _touch(self, task_id):
+        # Must be called while holding `self._lock`.
+        self._version += 1
+        self._tasks[task_id]["version"] = self._version
+        self._changelog.append((self._version, task_id))
+        self._changed.notify_all()
+
+    def _signal(self, task_id):
+        # Must be called while holding `self._lock`.
+        self._ready.append(task_id)
+        self._wakeup.notify_all()
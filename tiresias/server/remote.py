@@ -1,61 +1,126 @@
 """
-This module provides helper functions for calling the REST API.
+This module provides helper functions for calling the REST API. All the helpers
+share a single `Session` which keeps the connections to the server alive; use
+`configure` to change the pool size, timeout or retry policy.
 """
+import urllib3
 import requests
 import urllib.parse
 from time import sleep
-from json import loads, dumps
+from random import random
+from json import loads
 from tiresias.core import b64_decode
 
-def retry(func):
-    nb_tries = 3
-    def _f(*args, **kwargs):
-        for i in range(1, nb_tries + 1):
+class Session(object):
+
+    def __init__(self, pool_size=10, timeout=30.0, max_retries=3, backoff=0.1, max_backoff=5.0):
+        """
+        The Session object wraps a `requests.Session` whose connection pool holds up to `pool_size`
+        keep-alive connections per host. Requests which fail to connect or time out after `timeout`
+        seconds are retried up to `max_retries` times, waiting `backoff * 2^i` seconds (with jitter,
+        capped at `max_backoff`) between attempts. POST requests are only retried if the connection
+        couldn't be established since the server may have already processed them otherwise.
+        """
+        assert type(max_retries) == int and max_retries >= 0, "The number of retries should be non-negative."
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def request(self, method, server, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        url = urllib.parse.urljoin(server, path)
+        for i in range(self.max_retries + 1):
             try:
-                results = func(*args, **kwargs)
-                break
-            except requests.exceptions.ConnectionError:
-                sleep(0.1 * i)
-                if i == nb_tries:
+                return self._session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if i == self.max_retries or (method == "POST" and not _connect_error(e)):
                     raise
-        return results
-    return _f
+                delay = min(self.backoff * 2 ** i, self.max_backoff)
+                sleep(delay * (0.5 + random() / 2))
+
+    def get(self, server, path, **kwargs):
+        return self.request("GET", server, path, **kwargs)
+
+    def post(self, server, path, **kwargs):
+        return self.request("POST", server, path, **kwargs)
+
+    def close(self):
+        self._session.close()
+
+def _connect_error(e):
+    # Whether the request failed before it was sent, i.e. while establishing the connection.
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = e.args[0] if e.args else None
+    return isinstance(getattr(reason, "reason", reason), urllib3.exceptions.NewConnectionError)
+
+_session = Session()
+
+def configure(**kwargs):
+    """
+    Replace the session shared by the helper functions; the keyword arguments
+    are passed to `Session`. The previous session is not closed since other
+    threads may still be using it; its connections are released once it is
+    garbage collected.
+    """
+    global _session
+    _session = Session(**kwargs)
 
-@retry
 def list_tasks(server):
     """
     This helper function submits a GET request to obtain a list of queries.
     """
-    return loads(requests.get(urllib.parse.urljoin(server, "/list")).text)
+    return loads(_session.get(server, "/list").text)
+
+def poll_tasks(server, cursor=0, timeout=30.0):
+    """
+    This helper function submits a long-polling GET request which blocks for up
+    to `timeout` seconds until a task is created or changes state. It returns
+    the new cursor along with a dictionary containing the tasks which have
+    changed since `cursor`; pass the new cursor to the next call.
+    """
+    params = {"since": cursor, "timeout": timeout}
+    obj = loads(_session.get(server, "/list", params=params, timeout=timeout + _session.timeout).text)
+    return obj["cursor"], obj["tasks"]
 
-@retry
 def create_task(server, task):
     """
-    This helper function submits a GET request to create a new query. See the 
-    client-side query handler `tiersias.client.handler` documentation for 
+    This helper function submits a POST request to create a new query. See the
+    client-side query handler `tiersias.client.handler` documentation for
     examples of valid queries.
     """
-    return requests.get(urllib.parse.urljoin(server, "/task"), params={
-        "task": dumps(task)
-    }).text
+    return _session.post(server, "/task", json=task).text
 
-@retry
 def approve_task(server, task_id, payload):
     """
-    This helper function submits a GET request to contribute data to a given
-    query.
+    This helper function submits a POST request to contribute data to a given
+    query. The payload is sent as JSON unless it is a bytes object (i.e. the
+    output of `tiresias.core.codec.encode`) in which case it is sent as is.
     """
-    return requests.get(urllib.parse.urljoin(server, "/task/%s/submit" % task_id), params={
-        "payload": dumps(payload)
-    })
+    path = "/task/%s/submit" % task_id
+    if isinstance(payload, (bytes, bytearray)):
+        return _session.post(server, path, data=payload, headers={"Content-Type": "application/octet-stream"})
+    return _session.post(server, path, json=payload)
+
+def approve_tasks(server, payloads):
+    """
+    This helper function submits a single POST request to contribute data to
+    several queries, where `payloads` maps each task id to its payload. It
+    returns a dictionary indicating whether each payload was accepted.
+    """
+    return loads(_session.post(server, "/submit", json=payloads).text)
 
-@retry
 def fetch_task(server, task_id):
     """
-    This helper function submits a GET request to obtain a list of queries.
+    This helper function submits a GET request to obtain a specific query and
+    decodes its result.
     """
-    obj = requests.get(urllib.parse.urljoin(server, "/task/%s" % task_id)).text
-    obj = loads(obj)
+    obj = loads(_session.get(server, "/task/%s" % task_id).text)
     if "error" in obj:
         raise ValueError(obj["error"])
     try:
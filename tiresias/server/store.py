@@ -0,0 +1,200 @@
+"""
+This module provides the storage backends used by the `Platform` to keep track of the tasks and
+the payloads which have been submitted to them.
+"""
+import pickle
+import sqlite3
+import threading
+from time import time
+from json import loads, dumps
+from tiresias.server.handler import create_payloads
+
+class MemoryStore(object):
+
+    def __init__(self):
+        """
+        The MemoryStore keeps all the payloads in memory; everything is lost when the server is
+        restarted. This is the default backend.
+        """
+        self._payloads = {}
+
+    def load(self):
+        """
+        Return a dictionary containing the tasks which should be recovered on startup.
+        """
+        return {}
+
+    def create(self, task):
+        """
+        Start collecting payloads for a new task.
+        """
+        self._payloads[task["id"]] = create_payloads(task)
+
+    def update(self, task):
+        """
+        Persist the latest version of the task metadata.
+        """
+        pass
+
+    def delete(self, task_id):
+        """
+        Delete the task and its payloads.
+        """
+        self._payloads.pop(task_id, None)
+
+    def append(self, task_id, payload):
+        """
+        Store the payload and return the number of payloads submitted to the task.
+        """
+        self._payloads[task_id].append(payload)
+        return len(self._payloads[task_id])
+
+    def payloads(self, task_id):
+        """
+        Return a snapshot of the payloads which can be passed to the task handler.
+        """
+        return self._payloads[task_id].copy()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class SQLiteStore(object):
+
+    def __init__(self, path, durable=True, batch_size=256, flush_interval=1.0):
+        """
+        The SQLiteStore writes the tasks and payloads to a SQLite database in WAL mode so that they
+        survive a restart. Only the task metadata and the constant size accumulators (see
+        `tiresias.server.handler.create_payloads`) are kept in memory; the raw payloads are read
+        back from disk when the task is executed. The tasks which use an accumulator only store its
+        state rather than every payload.
+
+        If `durable` is set, each payload is committed before `append` returns so a payload which
+        the server has acknowledged survives a crash of the server process. Otherwise, the payloads
+        are buffered and written in batches of `batch_size` or every `flush_interval` seconds,
+        whichever comes first, which is faster but loses the buffered payloads on a crash.
+        """
+        self._path = path
+        self._lock = threading.RLock()
+        self._durable = durable
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._last_flush = time()
+        self._buffer = []
+        self._dirty = set()
+        self._counts = {}
+        self._accumulators = {}
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS tasks (task_id TEXT PRIMARY KEY, task TEXT);
+            CREATE TABLE IF NOT EXISTS payloads (task_id TEXT, payload TEXT);
+            CREATE TABLE IF NOT EXISTS accumulators (task_id TEXT PRIMARY KEY, state BLOB);
+            CREATE INDEX IF NOT EXISTS payloads_task_id ON payloads (task_id);
+        """)
+
+    def load(self):
+        with self._lock:
+            tasks = {}
+            for task_id, task in self._connection.execute("SELECT task_id, task FROM tasks"):
+                tasks[task_id] = loads(task)
+                tasks[task_id]["count"] = 0
+                self._counts[task_id] = 0
+            for task_id, count in self._connection.execute("SELECT task_id, COUNT(*) FROM payloads GROUP BY task_id"):
+                if task_id in tasks:
+                    tasks[task_id]["count"] = count
+                    self._counts[task_id] = count
+            for task_id, state in self._connection.execute("SELECT task_id, state FROM accumulators"):
+                if task_id in tasks:
+                    self._accumulators[task_id] = pickle.loads(state)
+                    tasks[task_id]["count"] = self._counts[task_id] = len(self._accumulators[task_id])
+            for task_id, task in tasks.items():
+                if task_id not in self._accumulators:
+                    payloads = create_payloads(task)
+                    if not isinstance(payloads, list):
+                        self._accumulators[task_id] = payloads
+            return tasks
+
+    def create(self, task):
+        with self._lock:
+            payloads = create_payloads(task)
+            if not isinstance(payloads, list):
+                self._accumulators[task["id"]] = payloads
+            self._counts[task["id"]] = 0
+            self.update(task)
+
+    def update(self, task):
+        with self._lock:
+            with self._connection:
+                self._connection.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?)", (task["id"], dumps(task)))
+
+    def delete(self, task_id):
+        with self._lock:
+            self.flush()
+            with self._connection:
+                self._connection.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+                self._connection.execute("DELETE FROM payloads WHERE task_id = ?", (task_id,))
+                self._connection.execute("DELETE FROM accumulators WHERE task_id = ?", (task_id,))
+            self._counts.pop(task_id, None)
+            self._accumulators.pop(task_id, None)
+
+    def append(self, task_id, payload):
+        with self._lock:
+            if task_id in self._accumulators:
+                self._accumulators[task_id].append(payload)
+                self._dirty.add(task_id)
+            else:
+                if not isinstance(payload, (bytes, bytearray)):
+                    payload = dumps(payload)
+                self._buffer.append((task_id, payload))
+            self._counts[task_id] += 1
+            if self._durable or len(self._buffer) >= self._batch_size or time() - self._last_flush > self._flush_interval:
+                self.flush()
+            return self._counts[task_id]
+
+    def payloads(self, task_id):
+        with self._lock:
+            if task_id in self._accumulators:
+                return self._accumulators[task_id].copy()
+            self.flush()
+        if self._path == ":memory:":
+            with self._lock:
+                return list(self._read(self._connection, task_id))
+
+        # Read the payloads on a separate connection so that other tasks can keep appending.
+        connection = sqlite3.connect(self._path)
+        try:
+            return list(self._read(connection, task_id))
+        finally:
+            connection.close()
+
+    def _read(self, connection, task_id):
+        cursor = connection.execute("SELECT payload FROM payloads WHERE task_id = ? ORDER BY rowid", (task_id,))
+        for payload, in cursor:
+            # Binary payloads are stored as BLOBs and returned as is.
+            yield payload if isinstance(payload, bytes) else loads(payload)
+
+    def flush(self):
+        """
+        Write the buffered payloads and the state of the accumulators which have changed to disk
+        in a single transaction.
+        """
+        with self._lock:
+            if self._buffer or self._dirty:
+                states = [(task_id, pickle.dumps(self._accumulators[task_id])) for task_id in self._dirty
+                    if task_id in self._accumulators]
+                with self._connection:
+                    self._connection.executemany("INSERT INTO payloads VALUES (?, ?)", self._buffer)
+                    self._connection.executemany("INSERT OR REPLACE INTO accumulators VALUES (?, ?)", states)
+                self._buffer = []
+                self._dirty = set()
+            self._last_flush = time()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._connection.close()